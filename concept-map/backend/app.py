@@ -2,9 +2,11 @@ import os
 import secrets
 from http import HTTPStatus
 
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
+from flask_compress import Compress
 from flask_cors import CORS
 from flask_migrate import Migrate
+from sqlalchemy import event
 
 # Concept map logic imports
 import concept_map_generation.crud_routes  # noqa
@@ -12,48 +14,119 @@ import concept_map_generation.crud_routes  # noqa
 from auth.routes import auth_bp
 from concept_map_generation.generation_routes import concept_map_bp
 from debug.routes import debug_bp
-from models import db
+from init_db import init_database
+from json_provider import OrjsonProvider
+from models import db, utc_now
 from notes.routes import notes_bp
 from process.routes import process_bp
+from tasks.routes import tasks_bp
 from templates.routes import templates_bp
 from user.routes import user_bp
 
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", secrets.token_hex(16))
-
-# Configure CORS
-CORS(
-    app,
-    origins=[os.environ.get("FRONTEND_URL", "http://localhost:5173")],
-    methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept"],
-    expose_headers=["Content-Type", "Authorization"],
-    max_age=3600,
-)
-
-# Database configuration
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///concept_map.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB max file size
-
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-with app.app_context():
-    db.create_all()
-
-# Register blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(concept_map_bp)
-app.register_blueprint(debug_bp)
-app.register_blueprint(process_bp)
-app.register_blueprint(user_bp)
-app.register_blueprint(notes_bp)
-app.register_blueprint(templates_bp)
-
-
-# Health check endpoint
-@app.route("/api/health/")
-def health_check():
-    return jsonify({"status": "healthy"}), HTTPStatus.OK
+migrate = Migrate()
+compress = Compress()
+
+
+def enable_sqlite_wal(dbapi_connection, connection_record):
+    """Let readers carry on while a write commits, and skip the fsync on every commit."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def database_uri(url):
+    """Point plain postgres:// and postgresql:// URLs at the psycopg 3 driver."""
+    for scheme in ("postgres://", "postgresql://"):
+        if url.startswith(scheme):
+            return "postgresql+psycopg://" + url[len(scheme):]
+    return url
+
+
+def create_app(config=None):
+    """Create and configure the Flask application."""
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.secret_key = os.environ.get("SECRET_KEY", secrets.token_hex(16))
+
+    # Configure CORS, browsers may cache preflight responses for a day
+    CORS(
+        app,
+        origins=[os.environ.get("FRONTEND_URL", "http://localhost:5173")],
+        methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization", "Accept"],
+        expose_headers=["Content-Type", "Authorization"],
+        max_age=86400,
+    )
+
+    # Database configuration
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri(os.environ.get("DATABASE_URL", "sqlite:///concept_map.db"))
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_pre_ping": True,  # Drop connections the database closed while idle
+        "pool_recycle": 1800,
+        "query_cache_size": 1200,  # Compiled statement cache, sized above the default 500
+    }
+    app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB max file size
+    # Raise on unexpected lazy loads outside production to catch N+1 queries early
+    app.config["RAISE_ON_LAZY"] = os.environ.get("FLASK_ENV") != "production"
+    # Compress JSON and SVG responses; map payloads with an embedded image shrink several times over
+    app.config["COMPRESS_MIMETYPES"] = ["application/json", "image/svg+xml"]
+    app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+    app.config["COMPRESS_LEVEL"] = 5
+    app.config["COMPRESS_BR_LEVEL"] = 5
+    app.config["COMPRESS_MIN_SIZE"] = 1024
+    if config:
+        app.config.update(config)
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        )
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql+psycopg://"):
+        # Have Postgres prepare a statement once a connection has run it a few times,
+        # so the hot SELECTs are planned once per connection instead of on every request
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {"prepare_threshold": 5}
+
+    # Initialize extensions
+    db.init_app(app)
+    migrate.init_app(app, db)
+    compress.init_app(app)
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        with app.app_context():
+            event.listen(db.engine, "connect", enable_sqlite_wal)
+
+    # Schema changes are applied with `flask db upgrade`, only set up an empty database when asked to
+    if os.environ.get("FLASK_INIT_DB") == "1":
+        init_database(app)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(concept_map_bp)
+    app.register_blueprint(debug_bp)
+    app.register_blueprint(process_bp)
+    app.register_blueprint(user_bp)
+    app.register_blueprint(notes_bp)
+    app.register_blueprint(templates_bp)
+    app.register_blueprint(tasks_bp)
+
+    @app.before_request
+    def stamp_request_time():
+        # Read the clock once so every timestamp written by a request agrees
+        g.request_time = utc_now()
+
+    # Reject oversized uploads from the Content-Length header before any of the body is read
+    @app.before_request
+    def reject_oversized_request():
+        if request.content_length is not None and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+            return jsonify({"error": "Request body too large"}), HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+    # Health check endpoint
+    @app.route("/api/health/")
+    def health_check():
+        return jsonify({"status": "healthy"}), HTTPStatus.OK
+
+    return app
+
+
+app = create_app()
@@ -1,27 +1,137 @@
+import mimetypes
 import os
+import tempfile
+import threading
+import time
 import uuid
 from http import HTTPStatus
 
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, Response, jsonify, request, send_from_directory
 from werkzeug.utils import secure_filename
-from auth_utils import get_auth0_user, requires_auth
-from models import db
+from auth_utils import forget_auth0_user, get_auth0_user, requires_auth
+from models import ConceptMap, Note, db
 
 auth_bp = Blueprint("auth", __name__)
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Internal nginx location serving UPLOAD_FOLDER, when set uploads are handed off to nginx
+X_ACCEL_UPLOADS_PREFIX = os.environ.get("X_ACCEL_UPLOADS_PREFIX")
+# Public origin used in generated upload URLs, falls back to the request's Host header
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "").rstrip("/")
+
+# Removed avatars are renamed into the trash folder and unlinked later in batches
+TRASH_FOLDER = os.path.join(UPLOAD_FOLDER, ".trash")
+os.makedirs(TRASH_FOLDER, exist_ok=True)
+TRASH_REAP_INTERVAL = 300  # seconds
+
+_reaper_started = False
+_reaper_lock = threading.Lock()
+
+
+def _empty_trash():
+    for entry in os.scandir(TRASH_FOLDER):
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _reap_trash():
+    while True:
+        time.sleep(TRASH_REAP_INTERVAL)
+        _empty_trash()
+
+
+def _trash_file(filepath):
+    """Move a file out of the uploads folder, leaving the actual unlink to the reaper thread."""
+    global _reaper_started
+    try:
+        os.rename(filepath, os.path.join(TRASH_FOLDER, uuid.uuid4().hex))
+    except FileNotFoundError:
+        return
+
+    if not _reaper_started:
+        with _reaper_lock:
+            if not _reaper_started:
+                threading.Thread(target=_reap_trash, name="avatar-trash-reaper", daemon=True).start()
+                _reaper_started = True
+
+
+def _trash_avatar(avatar_url):
+    """Trash an avatar file stored under uploads, avatars hosted elsewhere are left alone."""
+    if avatar_url and avatar_url.startswith("/uploads/"):
+        _trash_file(os.path.join(UPLOAD_FOLDER, avatar_url.split("/")[-1]))
+
+
+def _store_upload(filename, write):
+    """Write an upload into UPLOAD_FOLDER through a temporary file, so a failed write leaves nothing behind."""
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        # mkstemp only lets the owner read the file, nginx may serve it too
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(UPLOAD_FOLDER, filename))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _set_avatar(user, filename):
+    """Point the user at an uploaded avatar and trash the one it replaces."""
+    previous = user.avatar_url
+    avatar_path = f"/uploads/{filename}"
+    user.update_profile(avatar_url=avatar_path)
+    db.session.commit()
+    _trash_avatar(previous)
+    return jsonify({"message": "Avatar uploaded", "avatarUrl": public_url(avatar_path)}), HTTPStatus.OK
+
+
+ALLOWED_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "gif"})
+
+
+def public_url(url):
+    """Absolute URL for a path on this API such as a stored /uploads/ avatar, other URLs pass through."""
+    if not url or not url.startswith("/"):
+        return url
+    return f"{PUBLIC_BASE_URL or request.host_url.rstrip('/')}{url}"
+
+
+def profile_dict(user):
+    # Uploaded avatars are stored as /uploads/ paths so they survive the API moving hosts
+    return {**user.to_dict(), "avatarUrl": public_url(user.avatar_url)}
 
 
 def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition(".")
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
+
+# Leading bytes of each accepted image format, mapped to the extension we store it under
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+STREAM_CHUNK_SIZE = 1 << 20  # 1 MiB
 
 
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+def sniff_image_type(header):
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
 
 
 @auth_bp.route("/uploads/<filename>/")
 def uploaded_file(filename):
+    if X_ACCEL_UPLOADS_PREFIX:
+        # Let nginx send the file itself (see nginx.conf.example)
+        filename = secure_filename(filename)
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = f"{X_ACCEL_UPLOADS_PREFIX.rstrip('/')}/{filename}"
+        return response
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 
@@ -30,7 +140,7 @@ def uploaded_file(filename):
 @requires_auth
 def get_profile():
     user = get_auth0_user()
-    return jsonify(user.to_dict()), HTTPStatus.OK
+    return jsonify(profile_dict(user)), HTTPStatus.OK
 
 
 @auth_bp.route("/api/auth/profile/", methods=["PUT"])
@@ -40,7 +150,7 @@ def update_profile():
     data = request.json
     user.update_profile(display_name=data.get("displayName"), bio=data.get("bio"))
     db.session.commit()
-    return jsonify(user.to_dict()), HTTPStatus.OK
+    return jsonify(profile_dict(user)), HTTPStatus.OK
 
 
 @auth_bp.route("/api/auth/profile/avatar/", methods=["POST"])
@@ -58,16 +168,34 @@ def upload_avatar():
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
+        _store_upload(unique_filename, file.save)
+        return _set_avatar(user, unique_filename)
 
-        avatar_url = f"{request.host_url.rstrip('/')}/uploads/{unique_filename}"
-        user.update_profile(avatar_url=avatar_url)
-        db.session.commit()
+    return jsonify({"error": "Invalid file type"}), HTTPStatus.BAD_REQUEST
 
-        return jsonify({"message": "Avatar uploaded", "avatarUrl": avatar_url}), HTTPStatus.OK
 
-    return jsonify({"error": "Invalid file type"}), HTTPStatus.BAD_REQUEST
+@auth_bp.route("/api/auth/profile/avatar-raw/", methods=["PUT"])
+@requires_auth
+def upload_avatar_raw():
+    """Upload an avatar sent as the raw request body, bypassing multipart parsing."""
+    user = get_auth0_user()
+
+    if request.mimetype not in ("application/octet-stream", "image/png", "image/jpeg", "image/gif"):
+        return jsonify({"error": "Unsupported content type"}), HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+    header = request.stream.read(16)
+    extension = sniff_image_type(header)
+    if extension is None:
+        return jsonify({"error": "Invalid file type"}), HTTPStatus.BAD_REQUEST
+
+    def write(f):
+        f.write(header)
+        while chunk := request.stream.read(STREAM_CHUNK_SIZE):
+            f.write(chunk)
+
+    unique_filename = f"{uuid.uuid4()}.{extension}"
+    _store_upload(unique_filename, write)
+    return _set_avatar(user, unique_filename)
 
 
 @auth_bp.route("/api/auth/profile/avatar/", methods=["DELETE"])
@@ -76,11 +204,7 @@ def remove_avatar():
     user = get_auth0_user()
 
     # Delete the avatar file if it exists
-    if user.avatar_url and user.avatar_url.startswith("/uploads/"):
-        filename = user.avatar_url.split("/")[-1]
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    _trash_avatar(user.avatar_url)
 
     # Remove avatar reference from DB
     user.update_profile(avatar_url=None)
@@ -95,15 +219,17 @@ def delete_account():
     user = get_auth0_user()
 
     # Delete avatar
-    if user.avatar_url and user.avatar_url.startswith("/uploads/"):
-        filepath = os.path.join(UPLOAD_FOLDER, user.avatar_url.split("/")[-1])
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    _trash_avatar(user.avatar_url)
 
-    # Mark as inactive and soft delete maps
+    # Mark as inactive and soft delete maps and notes with a single UPDATE each
     user.deactivate()
-    for m in user.concept_maps:
-        m.is_deleted = True
+    ConceptMap.query.filter_by(user_id=user.id, is_deleted=False).update(
+        {ConceptMap.is_deleted: True}, synchronize_session=False
+    )
+    Note.query.filter_by(user_id=user.id, is_deleted=False).update(
+        {Note.is_deleted: True}, synchronize_session=False
+    )
     db.session.commit()
+    forget_auth0_user(user.auth0_id)
 
     return jsonify({"message": "Account deleted"}), HTTPStatus.OK
@@ -1,57 +1,167 @@
+import logging
 import os
+import threading
+import time
 from functools import wraps
 from http import HTTPStatus
 
 import requests
+from authlib.common.encoding import json_loads, urlsafe_b64decode
 from authlib.jose import JsonWebToken
-from flask import request, jsonify
+from cachetools import TLRUCache, TTLCache
+from flask import g, request, jsonify
+from sqlalchemy.exc import IntegrityError
 
 from models import User, db
 
+logger = logging.getLogger(__name__)
+
 AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN", "your-tenant.auth0.com")
 API_AUDIENCE = os.getenv("AUTH0_API_AUDIENCE", "https://your-api-identifier")
 JWKS_URL = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
 
-# Safely get JWKS with error handling
-try:
-    response = requests.get(JWKS_URL)
-    if response.status_code != 200:
-        print(f"Error fetching JWKS: HTTP {response.status_code}")
-        print(f"Please check your AUTH0_DOMAIN environment variable (current: {AUTH0_DOMAIN})")
-        JWKS = {"keys": []}  # Empty JWKS as fallback
+# Signing keys are refetched hourly so key rotations at Auth0 get picked up, and retried
+# sooner after a failed fetch or when a token names a key ID we don't have yet
+JWKS_TTL = 3600
+JWKS_RETRY_INTERVAL = 60
+_jwks = {"keys": []}
+_jwks_kids = frozenset()
+_jwks_expires_at = 0.0
+_jwks_fetched_at = float("-inf")
+# Held while fetching, requests that already have keys never wait on it
+_jwks_lock = threading.Lock()
+
+# Validated token claims, kept until the token expires or for at most TOKEN_CACHE_TTL seconds
+TOKEN_CACHE_TTL = 300
+_token_cache = TLRUCache(
+    maxsize=4096,
+    ttu=lambda token, claims, now: min(claims["exp"], now + TOKEN_CACHE_TTL),
+    timer=time.time,
+)
+_token_cache_lock = threading.Lock()
+
+# Auth0 subject -> local user ID, so per-user endpoints can authorize without loading the user
+_user_ids = TTLCache(maxsize=4096, ttl=3600)
+_user_ids_lock = threading.Lock()
+
+
+def fetch_jwks():
+    """Fetch Auth0's signing keys, returning None when they can't be retrieved."""
+    try:
+        response = requests.get(JWKS_URL, timeout=10)
+        if response.status_code != 200:
+            logger.error(
+                "Error fetching JWKS: HTTP %s, please check your AUTH0_DOMAIN environment variable (current: %s)",
+                response.status_code,
+                AUTH0_DOMAIN,
+            )
+            return None
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(
+            "Network error fetching JWKS: %s, please check that AUTH0_DOMAIN in your .env file "
+            "is your Auth0 domain (current: %s)",
+            e,
+            AUTH0_DOMAIN,
+        )
+        return None
+
+
+def _jwks_need_refresh(kid):
+    now = time.monotonic()
+    if now >= _jwks_expires_at:
+        return True
+    # An unknown key ID usually means Auth0 rotated its keys, but don't let bogus IDs refetch every time
+    return kid is not None and kid not in _jwks_kids and now - _jwks_fetched_at >= JWKS_RETRY_INTERVAL
+
+
+def _refresh_jwks():
+    global _jwks, _jwks_kids, _jwks_expires_at, _jwks_fetched_at
+
+    _jwks_fetched_at = now = time.monotonic()
+    jwks = fetch_jwks()
+    if jwks is not None:
+        _jwks_kids = frozenset(key.get("kid") for key in jwks.get("keys", ()))
+        _jwks = jwks
+        _jwks_expires_at = now + JWKS_TTL
     else:
-        JWKS = response.json()
-except requests.exceptions.RequestException as e:
-    print(f"Network error fetching JWKS: {e}")
-    print(f"Please check your AUTH0_DOMAIN environment variable (current: {AUTH0_DOMAIN})")
-    print("Make sure you've set up the correct Auth0 domain in your .env file")
-    JWKS = {"keys": []}  # Empty JWKS as fallback
+        # Keep using the last good keys (if any) and try again shortly
+        _jwks_expires_at = now + JWKS_RETRY_INTERVAL
+
+
+def get_jwks(kid=None):
+    """Return the cached signing keys, refreshing them once they're stale or don't include ``kid``."""
+    if not _jwks_need_refresh(kid):
+        return _jwks
+
+    # Only one request fetches, the others carry on with the keys they have unless there are none yet
+    if not _jwks_lock.acquire(blocking=not _jwks["keys"]):
+        return _jwks
+    try:
+        if _jwks_need_refresh(kid):
+            _refresh_jwks()
+    finally:
+        _jwks_lock.release()
+    return _jwks
+
+
+def token_kid(token):
+    """Key ID from a token's header, or None when the header can't be read."""
+    try:
+        header = json_loads(urlsafe_b64decode(token.split(".", 1)[0].encode() + b"=="))
+    except ValueError:
+        return None
+    return header.get("kid") if isinstance(header, dict) else None
+
 
 jwt = JsonWebToken(["RS256"])
 
 
+def decode_token(token):
+    """Validate a bearer token and return its claims, reusing earlier results for the same token."""
+    with _token_cache_lock:
+        claims = _token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(
+        token,
+        key=get_jwks(token_kid(token)),
+        claims_options={
+            "iss": {"values": [f"https://{AUTH0_DOMAIN}/"]},
+            "aud": {"values": [API_AUDIENCE]},
+        }
+    )
+    claims.validate()  # ✅ no args needed
+
+    if "exp" in claims:
+        with _token_cache_lock:
+            _token_cache[token] = claims
+    return claims
+
+
+def authenticate_request():
+    """Validate the bearer token into request.auth_user, returning an error response when it isn't valid."""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"error": "Authorization header missing or malformed"}), HTTPStatus.UNAUTHORIZED
+
+    token = auth_header.split(" ")[1]
+
+    try:
+        request.auth_user = decode_token(token)
+    except Exception as e:
+        return jsonify({"error": "Token invalid", "message": str(e)}), HTTPStatus.UNAUTHORIZED
+
+    return None
+
+
 def requires_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
-            return jsonify({"error": "Authorization header missing or malformed"}), HTTPStatus.UNAUTHORIZED
-
-        token = auth_header.split(" ")[1]
-
-        try:
-            claims = jwt.decode(
-                token,
-                key=JWKS,
-                claims_options={
-                    "iss": {"values": [f"https://{AUTH0_DOMAIN}/"]},
-                    "aud": {"values": [API_AUDIENCE]},
-                }
-            )
-            claims.validate()  # ✅ no args needed
-            request.auth_user = claims
-        except Exception as e:
-            return jsonify({"error": "Token invalid", "message": str(e)}), HTTPStatus.UNAUTHORIZED
+        denied = authenticate_request()
+        if denied:
+            return denied
 
         return f(*args, **kwargs)
 
@@ -59,6 +169,41 @@ def requires_auth(f):
 
 
 def get_auth0_user():
+    # Handlers may call this more than once per request, only look the user up once
+    if "current_user" in g:
+        return g.current_user
+
+    g.current_user = _load_auth0_user()
+    return g.current_user
+
+
+def get_auth0_user_id():
+    """
+    Return the current user's ID, only querying for the user the first time a subject is seen.
+    Returns None for deactivated accounts, which are never cached.
+    """
+    sub = request.auth_user.get("sub")
+    with _user_ids_lock:
+        user_id = _user_ids.get(sub)
+    if user_id is not None:
+        return user_id
+
+    user = get_auth0_user()
+    if not user.is_active:
+        return None
+
+    with _user_ids_lock:
+        _user_ids[sub] = user.id
+    return user.id
+
+
+def forget_auth0_user(sub):
+    """Drop a subject from the user ID cache, once its account has been deactivated."""
+    with _user_ids_lock:
+        _user_ids.pop(sub, None)
+
+
+def _load_auth0_user():
     sub = request.auth_user.get("sub")
     token = request.headers.get("Authorization").split()[1]
 
@@ -80,20 +225,21 @@ def get_auth0_user():
     name = info.get("name", "")
     picture = info.get("picture", "")
 
-    # Check if a user with this email already exists
-    user = User.query.filter_by(email=email).first()
-    if user:
-        # Associate the new auth0_id with this user
+    # Create the user straight away and let the unique email constraint tell us
+    # whether the account already exists, instead of issuing a SELECT first
+    user = User(
+        auth0_id=sub,
+        email=email,
+        display_name=name,
+        avatar_url=picture
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(user)
+    except IntegrityError:
+        # A user with this email already exists, associate the new auth0_id with it
+        user = User.query.filter_by(email=email).first()
         user.auth0_id = sub
-    else:
-        # Create new user
-        user = User(
-            auth0_id=sub,
-            email=email,
-            display_name=name,
-            avatar_url=picture
-        )
-        db.session.add(user)
 
     db.session.commit()
     return user
@@ -1,18 +1,266 @@
-import secrets
+import base64
+import binascii
+import gzip
+import logging
+import os
+import threading
 import uuid
-from datetime import datetime
 from http import HTTPStatus
 
-from flask import request, jsonify
+import msgspec
+from cachetools import LRUCache, TTLCache
+from flask import Response, current_app, request, jsonify
+from sqlalchemy import Text, and_, case, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import load_only, raiseload, selectinload
 
 from auth_utils import requires_auth, get_auth0_user
 from concept_map_generation.generation_routes import concept_map_bp
-from models import db, ConceptMap, Node, Edge, User
+from models import db, ConceptMap, Node, Edge, User, generate_share_id, db_utcnow
+from schemas import ConceptMapCreate, ConceptMapUpdate, decode_request
+
+logger = logging.getLogger(__name__)
+
+# Decoded map images by ETag, with a gzipped copy of SVGs, so repeat requests skip the decode and compression
+_image_cache = LRUCache(
+    maxsize=32 * 1024 * 1024,
+    getsizeof=lambda entry: len(entry[0]) + len(entry[2] or b""),
+)
+_image_cache_lock = threading.Lock()
+
+# Encoded bodies of shared (public) maps and notes by ETag. The ETag carries updated_at,
+# so a save shows up straight away in every worker without any invalidation
+_shared_json = TTLCache(maxsize=32 * 1024 * 1024, ttl=300, getsizeof=len)
+_shared_json_lock = threading.Lock()
+
+def graph_options():
+    """Loader options for serializing maps together with their nodes and edges."""
+    options = [selectinload(ConceptMap.nodes), selectinload(ConceptMap.edges)]
+    if current_app.config.get("RAISE_ON_LAZY"):
+        # Make any other relationship access fail loudly instead of lazy loading per row
+        options.append(raiseload("*"))
+    return options
+
+
+def summary_options():
+    """Loader options for listing maps with only the columns to_list_dict serializes."""
+    return [
+        load_only(
+            ConceptMap.id,
+            ConceptMap.name,
+            ConceptMap.user_id,
+            ConceptMap.is_public,
+            ConceptMap.share_id,
+            ConceptMap.created_at,
+            ConceptMap.updated_at,
+            ConceptMap.format,
+            ConceptMap.learning_objective,
+            ConceptMap.description,
+            ConceptMap.is_favorite,
+            raiseload=True,
+        )
+    ]
+
+
+def summary_requested():
+    """Whether the client asked for the light list representation with ?view=summary."""
+    return request.args.get("view") == "summary"
+
+
+def _json_or_empty_object(column):
+    """SQL mirror of ``properties or {}`` for a JSON column that may hold SQL or JSON null."""
+    return case(
+        (func.coalesce(func.json_typeof(column), "null") == "null", literal_column("'{}'::json")),
+        else_=column,
+    )
+
+
+def _user_maps_json_pg(user_id):
+    """
+    Postgres only: build the JSON array returned by get_concept_maps in the database.
+    Mirrors ConceptMap.to_dict(), Node.to_dict() and Edge.to_dict().
+    """
+    maps, nodes, edges = ConceptMap.__table__, Node.__table__, Edge.__table__
+    empty_array = literal_column("'[]'::json")
+
+    node_json = func.json_build_object(
+        "id", nodes.c.node_id,
+        "label", nodes.c.label,
+        "position", case(
+            (
+                and_(nodes.c.position_x.isnot(None), nodes.c.position_y.isnot(None)),
+                func.json_build_object("x", nodes.c.position_x, "y", nodes.c.position_y),
+            )
+        ),
+        "properties", _json_or_empty_object(nodes.c.properties),
+    )
+    edge_json = func.json_build_object(
+        "id", edges.c.edge_id,
+        "source", edges.c.source,
+        "target", edges.c.target,
+        "label", edges.c.label,
+        "properties", _json_or_empty_object(edges.c.properties),
+    )
+    map_nodes = (
+        select(func.coalesce(func.json_agg(aggregate_order_by(node_json, nodes.c.id)), empty_array))
+        .where(nodes.c.concept_map_id == maps.c.id)
+        .scalar_subquery()
+    )
+    map_edges = (
+        select(func.coalesce(func.json_agg(aggregate_order_by(edge_json, edges.c.id)), empty_array))
+        .where(edges.c.concept_map_id == maps.c.id)
+        .scalar_subquery()
+    )
+    map_json = func.json_build_object(
+        "id", maps.c.id,
+        "name", maps.c.name,
+        "nodes", map_nodes,
+        "edges", map_edges,
+        "user_id", maps.c.user_id,
+        "is_public", maps.c.is_public,
+        "share_id", maps.c.share_id,
+        "created_at", maps.c.created_at,
+        "updated_at", maps.c.updated_at,
+        "image", maps.c.image,
+        "image_url", case(
+            (func.coalesce(maps.c.image, "") != "", func.concat("/api/concept-maps/", maps.c.id, "/image/"))
+        ),
+        "format", maps.c.format,
+        "whiteboard_content", maps.c.whiteboard_content,
+        "learning_objective", maps.c.learning_objective,
+        "description", maps.c.description,
+        "is_favorite", maps.c.is_favorite,
+        "input_text", maps.c.input_text,
+    )
+    # Cast to text so the driver hands back the JSON string instead of decoding it
+    stmt = select(cast(func.coalesce(func.json_agg(map_json), empty_array), Text)).where(
+        maps.c.user_id == user_id, maps.c.is_deleted.is_(False)
+    )
+    return db.session.scalar(stmt)
+
+
+def etag_version(updated_at):
+    """Microsecond timestamp used to build ETags, so saves within the same second still differ."""
+    return int(updated_at.timestamp() * 1_000_000) if updated_at else 0
+
+
+def shared_json_response(etag, build):
+    """JSON response for a shared resource, only calling build() and encoding it on a cache miss."""
+    with _shared_json_lock:
+        body = _shared_json.get(etag)
+    if body is None:
+        body = jsonify(build()).get_data()
+        with _shared_json_lock:
+            _shared_json[etag] = body
+    return with_etag(Response(body, mimetype="application/json"), etag, "public, no-cache")
 
-# NOTE: This list is kept for backward compatibility but is no longer used.
-# All data is now stored in the database.
-concept_maps = []
-users = []  # List to store user objects
+
+def not_modified_response(etag, cache_control):
+    """Return a 304 response when the client already has this version, otherwise None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(current_app.response_class(status=HTTPStatus.NOT_MODIFIED), etag, cache_control)
+
+
+def with_etag(response, etag, cache_control):
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+IMAGE_MIMETYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+}
+
+
+def _decode_image(image, image_format):
+    """
+    Turn a stored map image back into raw bytes and a mimetype. Images are stored either as a
+    data URL or as bare base64, with raw SVG markup accepted for older rows.
+    """
+    if image.startswith("data:"):
+        header, _, payload = image.partition(",")
+        mimetype = header[len("data:"):].split(";", 1)[0] or "application/octet-stream"
+        if ";base64" in header:
+            return base64.b64decode(payload), mimetype
+        return payload.encode(), mimetype
+
+    mimetype = IMAGE_MIMETYPES.get((image_format or "svg").lower(), "image/svg+xml")
+    if image.lstrip().startswith("<"):
+        return image.encode(), mimetype
+    return base64.b64decode(image, validate=True), mimetype
+
+
+def _get_user_map(map_id, user, **kwargs):
+    """Look a map up by primary key, returning None unless it is live and owned by ``user``."""
+    concept_map = db.session.get(ConceptMap, map_id, **kwargs)
+    if concept_map is None or concept_map.is_deleted or concept_map.user_id != user.id:
+        return None
+    return concept_map
+
+
+def _uuids(n):
+    """Generate ``n`` random UUID strings from a single read of OS randomness."""
+    raw = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=raw[i : i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+
+def _missing_ids(items):
+    """Iterator of fresh ids for the items that don't bring their own."""
+    return iter(_uuids(sum(1 for item in items if not item.id)))
+
+
+def _node_rows(map_id, nodes):
+    """Build the rows for bulk inserting a map's nodes from NodeIn structs."""
+    new_ids = _missing_ids(nodes)
+    return [
+        {
+            "concept_map_id": map_id,
+            "node_id": str(node.id or next(new_ids)),
+            "label": node.label,
+            "position_x": node.position.x if node.position else None,
+            "position_y": node.position.y if node.position else None,
+            "properties": node.properties,
+        }
+        for node in nodes
+    ]
+
+
+def _edge_rows(map_id, edges):
+    """Build the rows for bulk inserting a map's edges from EdgeIn structs."""
+    new_ids = _missing_ids(edges)
+    return [
+        {
+            "concept_map_id": map_id,
+            "edge_id": str(edge.id or next(new_ids)),
+            "source": str(edge.source),
+            "target": str(edge.target),
+            "label": edge.label,
+            "properties": edge.properties,
+        }
+        for edge in edges
+    ]
+
+
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+def _bulk_insert(model, build_rows, map_id, items):
+    """Bulk insert a map's nodes or edges, building and sending the rows a chunk at a time."""
+    for start in range(0, len(items), BULK_INSERT_CHUNK_SIZE):
+        chunk = items[start : start + BULK_INSERT_CHUNK_SIZE]
+        db.session.bulk_insert_mappings(model, build_rows(map_id, chunk))
+
+
+def add_map_graph(map_id, nodes, edges):
+    """Bulk insert the NodeIn and EdgeIn items of a freshly created map."""
+    if nodes:
+        _bulk_insert(Node, _node_rows, map_id, nodes)
+    if edges:
+        _bulk_insert(Edge, _edge_rows, map_id, edges)
 
 
 # Concept Map routes
@@ -21,9 +269,41 @@ users = []  # List to store user objects
 def get_concept_maps():
     user = get_auth0_user()
 
-    # Filter maps by user_id and not deleted
-    user_maps = ConceptMap.query.filter_by(user_id=user.id, is_deleted=False).all()
-    return jsonify([map.to_dict() for map in user_maps]), HTTPStatus.OK
+    # Any create, save or delete changes the number of maps or the latest update time
+    count, last_updated = db.session.execute(
+        select(func.count(ConceptMap.id), func.max(ConceptMap.updated_at)).where(
+            ConceptMap.user_id == user.id, ConceptMap.is_deleted.is_(False)
+        )
+    ).one()
+    summary = summary_requested()
+    etag = f"{user.id}-{count}-{etag_version(last_updated)}" + ("-summary" if summary else "")
+    not_modified = not_modified_response(etag, "private, must-revalidate")
+    if not_modified:
+        return not_modified
+
+    # Listing views that don't render the map content skip the graph, image and input text
+    if summary:
+        user_maps = db.session.scalars(
+            select(ConceptMap)
+            .options(*summary_options())
+            .where(ConceptMap.user_id == user.id, ConceptMap.is_deleted.is_(False))
+        ).all()
+        response = jsonify([map.to_list_dict() for map in user_maps])
+        return with_etag(response, etag, "private, must-revalidate"), HTTPStatus.OK
+
+    # On Postgres the whole response body is built in one query
+    if db.engine.dialect.name == "postgresql":
+        response = Response(_user_maps_json_pg(user.id), mimetype="application/json")
+        return with_etag(response, etag, "private, must-revalidate"), HTTPStatus.OK
+
+    # Filter maps by user_id and not deleted, loading nodes and edges up front
+    user_maps = db.session.scalars(
+        select(ConceptMap)
+        .options(*graph_options())
+        .where(ConceptMap.user_id == user.id, ConceptMap.is_deleted.is_(False))
+    ).all()
+    response = jsonify([map.to_dict() for map in user_maps])
+    return with_etag(response, etag, "private, must-revalidate"), HTTPStatus.OK
 
 
 @concept_map_bp.route("/", methods=["POST"])
@@ -31,108 +311,36 @@ def get_concept_maps():
 def create_concept_map():
     user = get_auth0_user()
 
-    data = request.json
-
-    # Basic validation
-    if not data or "name" not in data:
-        return jsonify({"error": "Missing required fields"}), HTTPStatus.BAD_REQUEST
-
-    # Generate a unique share ID
-    share_id = secrets.token_urlsafe(8)
-
-    # Check if we need to process the input text to generate nodes and edges
-    nodes = data.get("nodes", [])
-    edges = data.get("edges", [])
-
-    # If nodes and edges are not provided but we have input text,
-    # process it to generate nodes and edges
-    if not nodes and not edges and "input_text" in data and data["input_text"]:
-        try:
-            # Import the text extraction function
-            from concept_map_generation.mind_map import extract_concept_map_from_text
-
-            # Process the input text
-            concept_data = extract_concept_map_from_text(data["input_text"])
-
-            # Convert the concepts and relationships to nodes and edges
-            for concept in concept_data.get("concepts", []):
-                node = {
-                    "id": concept.get("id", f"c{len(nodes) + 1}"),
-                    "label": concept.get("name", "Unnamed Concept"),
-                    "description": concept.get("description", ""),
-                }
-                nodes.append(node)
-
-            for relationship in concept_data.get("relationships", []):
-                edge = {
-                    "source": relationship.get("source", ""),
-                    "target": relationship.get("target", ""),
-                    "label": relationship.get("label", "relates to"),
-                }
-                edges.append(edge)
-
-            # If we have nodes and edges generated, also create an SVG image
-            if nodes and edges:
-                try:
-                    from concept_map_generation.mind_map import generate_concept_map_svg
-
-                    # Create a concept map structure
-                    concept_map_json = {"nodes": nodes, "edges": edges}
-
-                    # Generate the SVG
-                    svg_b64 = generate_concept_map_svg(concept_map_json, "hierarchical")
-                    data["image"] = svg_b64
-                    data["format"] = "svg"
-                except Exception as img_error:
-                    print(f"Error generating SVG for concept map: {str(img_error)}")
-
-        except Exception as e:
-            print(f"Error processing input text for concept map: {str(e)}")
-            # Continue without generating nodes and edges
+    try:
+        body = decode_request(ConceptMapCreate)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": "Invalid request body", "message": str(e)}), HTTPStatus.BAD_REQUEST
 
     # Create a new concept map using SQLAlchemy model
     new_map = ConceptMap(
-        name=data["name"],
+        name=body.name,
         user_id=user.id,
-        image=data.get("image"),
-        format=data.get("format", "mindmap"),
-        is_public=data.get("is_public", False),
-        is_favorite=data.get("is_favorite", False),
-        share_id=share_id,
-        input_text=data.get("input_text", ""),
-        description=data.get("description", ""),
-        learning_objective=data.get("learning_objective", ""),
-        whiteboard_content=data.get("whiteboard_content"),
+        image=body.image,
+        format=body.format,
+        is_public=body.is_public,
+        is_favorite=body.is_favorite,
+        input_text=body.input_text,
+        description=body.description,
+        learning_objective=body.learning_objective,
+        whiteboard_content=body.whiteboard_content,
     )
 
     # For whiteboard maps, log that we're saving the content
-    if data.get("format") == "handdrawn" and "whiteboard_content" in data:
-        print(f"Creating whiteboard map with whiteboard content, size: {len(str(data['whiteboard_content']))}")
+    if body.format == "handdrawn" and body.whiteboard_content is not None and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Creating whiteboard map with whiteboard content, size: %d", len(str(body.whiteboard_content)))
 
-    # Add nodes if they exist
-    if nodes:
-        for node_data in nodes:
-            node = Node(
-                concept_map=new_map,
-                label=node_data.get("label", ""),
-                x=node_data.get("x", 0),
-                y=node_data.get("y", 0),
-            )
-            db.session.add(node)
+    # Flush the map first so its id is available for the node and edge rows
+    db.session.add(new_map)
+    db.session.flush()
 
-    # Add edges if they exist
-    if edges:
-        for edge_data in edges:
-            edge = Edge(
-                concept_map=new_map,
-                source_id=edge_data.get("source"),
-                target_id=edge_data.get("target"),
-                label=edge_data.get("label", ""),
-            )
-            db.session.add(edge)
+    # Insert nodes and edges in bulk rather than one ORM object at a time
+    add_map_graph(new_map.id, body.nodes, body.edges)
 
-    # Add and commit everything to the database
-    db.session.add(new_map)
     db.session.commit()
 
     # Return the newly created map
@@ -142,12 +350,13 @@ def create_concept_map():
                 "id": new_map.id,
                 "name": new_map.name,
                 "image": new_map.image,
+                "image_url": new_map.image_url,
                 "format": new_map.format,
                 "is_public": new_map.is_public,
                 "is_favorite": new_map.is_favorite,
                 "share_id": new_map.share_id,
-                "created_at": new_map.created_at.isoformat(),
-                "updated_at": new_map.updated_at.isoformat(),
+                "created_at": new_map.created_at,
+                "updated_at": new_map.updated_at,
                 "input_text": new_map.input_text,
                 "description": new_map.description,
                 "learning_objective": new_map.learning_objective,
@@ -159,148 +368,164 @@ def create_concept_map():
         HTTPStatus.CREATED,
     )
 
-    # Create a new concept map
-    new_map = ConceptMap(
-        name=data["name"],
-        description=data.get("description", ""),
-        user_id=user_id,
-        is_public=data.get("is_public", False),
-    )
 
-    db.session.add(new_map)
-    db.session.commit()
+@concept_map_bp.route("/<int:map_id>/", methods=["GET"])
+@requires_auth
+def get_concept_map(map_id):
+    user = get_auth0_user()
 
-    # Add nodes if provided
-    if "nodes" in data and isinstance(data["nodes"], list):
-        for node_data in data["nodes"]:
-            node = Node(
-                concept_map_id=new_map.id,
-                node_id=node_data.get("id", str(uuid.uuid4())),
-                label=node_data.get("label", ""),
-                position_x=node_data.get("position", {}).get("x"),
-                position_y=node_data.get("position", {}).get("y"),
-                properties=node_data.get("properties", {}),
-            )
-            db.session.add(node)
-
-    # Add edges if provided
-    if "edges" in data and isinstance(data["edges"], list):
-        for edge_data in data["edges"]:
-            edge = Edge(
-                concept_map_id=new_map.id,
-                edge_id=edge_data.get("id", str(uuid.uuid4())),
-                source=edge_data.get("source", ""),
-                target=edge_data.get("target", ""),
-                label=edge_data.get("label", ""),
-                properties=edge_data.get("properties", {}),
-            )
-            db.session.add(edge)
+    # Check access and freshness with a small query before loading the whole map
+    meta = db.session.execute(
+        select(
+            ConceptMap.updated_at, ConceptMap.user_id, ConceptMap.is_public, ConceptMap.is_deleted
+        ).where(ConceptMap.id == map_id)
+    ).first()
 
-    db.session.commit()
+    # Owners can always see the map and others only when it is public
+    if not meta or meta.is_deleted or (meta.user_id != user.id and not meta.is_public):
+        return jsonify({"error": "Concept map not found"}), HTTPStatus.NOT_FOUND
 
-    return jsonify(new_map.to_dict()), HTTPStatus.CREATED
+    etag = f"{map_id}-{etag_version(meta.updated_at)}"
+    not_modified = not_modified_response(etag, "private, must-revalidate")
+    if not_modified:
+        return not_modified
 
+    concept_map = db.session.get(ConceptMap, map_id, options=graph_options())
+    response = jsonify(concept_map.to_dict())
+    return with_etag(response, etag, "private, must-revalidate"), HTTPStatus.OK
 
-@concept_map_bp.route("/<int:map_id>/", methods=["GET"])
+
+@concept_map_bp.route("/<int:map_id>/image/", methods=["GET"])
 @requires_auth
-def get_concept_map(map_id):
-    # Find the concept map
-    concept_map = ConceptMap.query.filter_by(id=map_id).first()
+def get_concept_map_image(map_id):
+    """Serve a map's image as raw bytes, so clients can cache it apart from the map JSON."""
+    user = get_auth0_user()
 
-    if not concept_map:
+    meta = db.session.execute(
+        select(
+            ConceptMap.updated_at, ConceptMap.user_id, ConceptMap.is_public, ConceptMap.is_deleted
+        ).where(ConceptMap.id == map_id)
+    ).first()
+
+    if not meta or meta.is_deleted or (meta.user_id != user.id and not meta.is_public):
         return jsonify({"error": "Concept map not found"}), HTTPStatus.NOT_FOUND
-    return jsonify(concept_map.to_dict()), HTTPStatus.OK
+
+    etag = f"{map_id}-image-{etag_version(meta.updated_at)}"
+    not_modified = not_modified_response(etag, "private, must-revalidate")
+    if not_modified:
+        return not_modified
+
+    with _image_cache_lock:
+        entry = _image_cache.get(etag)
+
+    if entry is None:
+        row = db.session.execute(
+            select(ConceptMap.image, ConceptMap.format).where(ConceptMap.id == map_id)
+        ).one()
+        if not row.image:
+            return jsonify({"error": "Concept map has no image"}), HTTPStatus.NOT_FOUND
+
+        try:
+            data, mimetype = _decode_image(row.image, row.format)
+        except (binascii.Error, ValueError):
+            return jsonify({"error": "Stored image could not be decoded"}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+        # SVG is text and shrinks several times over, raster formats are already compressed
+        gzipped = gzip.compress(data, 6) if mimetype == "image/svg+xml" else None
+        entry = (data, mimetype, gzipped)
+        with _image_cache_lock:
+            _image_cache[etag] = entry
+
+    data, mimetype, gzipped = entry
+    if gzipped is not None and "gzip" in request.accept_encodings:
+        response = Response(gzipped, mimetype=mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(data, mimetype=mimetype)
+    response.vary.add("Accept-Encoding")
+    return with_etag(response, etag, "private, must-revalidate")
+
+
+def _shared_map_response(share_id):
+    """Respond with a public map found by its share ID, or 304 if the client has it already."""
+    meta = db.session.execute(
+        select(ConceptMap.id, ConceptMap.updated_at).where(
+            ConceptMap.share_id == share_id,
+            ConceptMap.is_public.is_(True),
+            ConceptMap.is_deleted.is_(False),
+        )
+    ).first()
+
+    if not meta:
+        return jsonify({"error": "Shared concept map not found or not public"}), HTTPStatus.NOT_FOUND
+
+    etag = f"{meta.id}-{etag_version(meta.updated_at)}"
+    not_modified = not_modified_response(etag, "public, no-cache")
+    if not_modified:
+        return not_modified
+
+    def build():
+        return db.session.get(ConceptMap, meta.id, options=graph_options()).to_dict()
+
+    return shared_json_response(etag, build), HTTPStatus.OK
 
 
 @concept_map_bp.route("/<string:share_id>/", methods=["GET"])
 def get_shared_concept_map(share_id):
     # This endpoint is public and doesn't require authentication
-    
-    # Find the concept map in the database by share_id
-    concept_map = ConceptMap.query.filter_by(share_id=share_id, is_public=True, is_deleted=False).first()
-    
-    if not concept_map:
-        return jsonify({"error": "Shared concept map not found or not public"}), HTTPStatus.NOT_FOUND
-    
-    return jsonify(concept_map.to_dict()), HTTPStatus.OK
+    return _shared_map_response(share_id)
+
+
+# Map columns a PUT may set directly
+MAP_UPDATE_FIELDS = tuple(f for f in ConceptMapUpdate.__struct_fields__ if f not in ("nodes", "edges"))
 
 
 @concept_map_bp.route("/<int:map_id>/", methods=["PUT"])
 @requires_auth
 def update_concept_map(map_id):
-    data = request.json
     user = get_auth0_user()
 
+    try:
+        body = decode_request(ConceptMapUpdate)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": "Invalid request body", "message": str(e)}), HTTPStatus.BAD_REQUEST
+
     # Find the concept map
-    concept_map = ConceptMap.query.filter_by(
-        id=map_id, user_id=user.id, is_deleted=False
-    ).first()
+    concept_map = _get_user_map(map_id, user)
 
     if not concept_map:
         return jsonify({"error": "Concept map not found"}), HTTPStatus.NOT_FOUND
 
-    # Update the map properties
-    if "name" in data:
-        concept_map.name = data["name"]
-    if "description" in data:
-        concept_map.description = data["description"]
-    if "is_public" in data:
-        concept_map.is_public = data["is_public"]
-    if "is_favorite" in data:
-        concept_map.is_favorite = data["is_favorite"]
-    if "image" in data:
-        concept_map.image = data["image"]
-    if "format" in data:
-        concept_map.format = data["format"]
-    if "input_text" in data:
-        concept_map.input_text = data["input_text"]
-    if "learning_objective" in data:
-        concept_map.learning_objective = data["learning_objective"]
-    # Save whiteboard content if provided
-    if "whiteboard_content" in data:
-        concept_map.whiteboard_content = data["whiteboard_content"]
-        print(f"Updating whiteboard content for map {map_id}, size: {len(str(data['whiteboard_content']))}")
-
-    # Update nodes if provided
-    if "nodes" in data and isinstance(data["nodes"], list):
-        # Delete existing nodes
-        Node.query.filter_by(concept_map_id=map_id).delete()
-
-        # Add new nodes
-        for node_data in data["nodes"]:
-            node = Node(
-                concept_map_id=map_id,
-                node_id=node_data.get("id", str(uuid.uuid4())),
-                label=node_data.get("label", ""),
-                position_x=node_data.get("position", {}).get("x"),
-                position_y=node_data.get("position", {}).get("y"),
-                properties=node_data.get("properties", {}),
-            )
-            db.session.add(node)
-
-    # Update edges if provided
-    if "edges" in data and isinstance(data["edges"], list):
-        # Delete existing edges
-        Edge.query.filter_by(concept_map_id=map_id).delete()
-
-        # Add new edges
-        for edge_data in data["edges"]:
-            edge = Edge(
-                concept_map_id=map_id,
-                edge_id=edge_data.get("id", str(uuid.uuid4())),
-                source=edge_data.get("source", ""),
-                target=edge_data.get("target", ""),
-                label=edge_data.get("label", ""),
-                properties=edge_data.get("properties", {}),
-            )
-            db.session.add(edge)
-
-    # Update the timestamp
-    concept_map.updated_at = datetime.utcnow()
+    # Update the map properties that were sent, nodes and edges are replaced below
+    for field in MAP_UPDATE_FIELDS:
+        value = getattr(body, field)
+        if value is not msgspec.UNSET:
+            setattr(concept_map, field, value)
+    if body.whiteboard_content is not msgspec.UNSET and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Updating whiteboard content for map %s, size: %d", map_id, len(str(body.whiteboard_content))
+        )
+
+    # Replace nodes if provided: one DELETE, then a bulk insert
+    if body.nodes is not msgspec.UNSET:
+        db.session.execute(Node.__table__.delete().where(Node.concept_map_id == map_id))
+        _bulk_insert(Node, _node_rows, map_id, body.nodes)
+
+    # Replace edges if provided: one DELETE, then a bulk insert
+    if body.edges is not msgspec.UNSET:
+        db.session.execute(Edge.__table__.delete().where(Edge.concept_map_id == map_id))
+        _bulk_insert(Edge, _edge_rows, map_id, body.edges)
+
+    # Bump the timestamp even when only nodes or edges changed, the database fills in the value
+    concept_map.updated_at = db_utcnow()
     
     # Commit changes to database
     db.session.commit()
 
+    # Reload the map with its new nodes and edges in one go instead of lazy loading them
+    concept_map = db.session.get(
+        ConceptMap, map_id, populate_existing=True, options=graph_options()
+    )
     return jsonify(concept_map.to_dict()), HTTPStatus.OK
 
 
@@ -310,9 +535,7 @@ def delete_concept_map(map_id):
     user = get_auth0_user()
 
     # Find the concept map
-    concept_map = ConceptMap.query.filter_by(
-        id=map_id, user_id=user.id, is_deleted=False
-    ).first()
+    concept_map = _get_user_map(map_id, user)
 
     if not concept_map:
         return jsonify({"error": "Concept map not found"}), HTTPStatus.NOT_FOUND
@@ -333,18 +556,18 @@ def share_concept_map(map_id):
     user = get_auth0_user()
 
     # Find the concept map in the database
-    concept_map = ConceptMap.query.filter_by(id=map_id, user_id=user.id, is_deleted=False).first()
+    concept_map = _get_user_map(map_id, user)
     
     if not concept_map:
         return jsonify({"error": "Concept map not found"}), HTTPStatus.NOT_FOUND
     
     # Update the map to be public
     concept_map.is_public = True
-    concept_map.updated_at = datetime.utcnow()
+    concept_map.updated_at = db_utcnow()
     
     # Make sure there's a share_id
     if not concept_map.share_id:
-        concept_map.share_id = secrets.token_urlsafe(8)
+        concept_map.share_id = generate_share_id()
     
     # Save changes to the database
     db.session.commit()
@@ -368,10 +591,4 @@ def get_public_concept_map(share_id):
     Get a public concept map by its share ID.
     This endpoint matches the frontend expectation at /api/shared/concept-maps/{share_id}/
     """
-    # Find the concept map in the database by share_id
-    concept_map = ConceptMap.query.filter_by(share_id=share_id, is_public=True, is_deleted=False).first()
-    
-    if not concept_map:
-        return jsonify({"error": "Shared concept map not found or not public"}), HTTPStatus.NOT_FOUND
-    
-    return jsonify(concept_map.to_dict()), HTTPStatus.OK
+    return _shared_map_response(share_id)
@@ -1,11 +1,19 @@
 import io
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import google.generativeai as genai
 from PIL import Image
 from dotenv import load_dotenv
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, convert_from_path
 
+logger = logging.getLogger(__name__)
+
+# Gemini calls for the batches/pages of a document are network bound, so several run at once
+ocr_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("OCR_CONCURRENCY", 4)), thread_name_prefix="ocr"
+)
 
 class DocumentProcessor:
     def __init__(self):
@@ -21,13 +29,13 @@ class DocumentProcessor:
 
         # Initialize Gemini 2.0 Flash model
         self.model = genai.GenerativeModel('gemini-2.0-flash')
-        print("Gemini 2.0 Flash model initialized successfully")
+        logger.info("Gemini 2.0 Flash model initialized successfully")
 
     def extract_text_from_pdf(self, file_content):
-        """Convert PDF to images"""
-        # Convert PDF to images
-        images = convert_from_bytes(file_content, dpi=300)
-        return images
+        """Convert PDF to images, given either its raw bytes or a path to the file"""
+        if isinstance(file_content, (str, os.PathLike)):
+            return convert_from_path(file_content, dpi=300)
+        return convert_from_bytes(file_content, dpi=300)
 
     def process_image(self, image):
         """Process a single image using Gemini"""
@@ -57,7 +65,7 @@ class DocumentProcessor:
                 return str(response)
 
         except Exception as e:
-            print(f"Error in process_image: {e}")
+            logger.exception("Error in process_image: %s", e)
             return "Error processing image. Please try again."
 
     def batch_images(self, images, batch_size=5):
@@ -98,7 +106,7 @@ class DocumentProcessor:
                 return str(response)
 
         except Exception as e:
-            print(f"Error processing batch: {e}")
+            logger.exception("Error processing batch: %s", e)
             # Fallback to processing each image individually
             results = []
             for img in batch:
@@ -114,11 +122,7 @@ class DocumentProcessor:
             # For smaller PDFs (under 20 pages), try processing in small batches
             if len(images) < 20:
                 batches = self.batch_images(images, batch_size=5)
-                extracted_texts = []
-
-                for batch in batches:
-                    batch_text = self.process_batch(batch)
-                    extracted_texts.append(batch_text)
+                extracted_texts = ocr_pool.map(self.process_batch, batches)
 
                 # Combine all extracted text
                 combined_text = "\n\n".join(extracted_texts)
@@ -126,10 +130,7 @@ class DocumentProcessor:
 
             # For larger PDFs, process each page individually
             else:
-                extracted_texts = []
-                for img in images:
-                    extracted_text = self.process_image(img)
-                    extracted_texts.append(extracted_text)
+                extracted_texts = ocr_pool.map(self.process_image, images)
 
                 # Combine all extracted text
                 combined_text = "\n\n".join(extracted_texts)
@@ -137,12 +138,52 @@ class DocumentProcessor:
 
         elif file_type in ["jpg", "jpeg", "png"]:
             # For single image files
-            img = Image.open(io.BytesIO(file_content))
+            if isinstance(file_content, (str, os.PathLike)):
+                img = Image.open(file_content)
+            else:
+                img = Image.open(io.BytesIO(file_content))
             return self.process_image(img)
 
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
 
+    def process_financial_batch(self, instruction, batch):
+        """Process a batch of financial document pages"""
+        extracted_texts = []
+        try:
+            response = self.model.generate_content([instruction] + batch)
+
+            # Properly handle the response
+            if hasattr(response, 'parts'):
+                extracted_texts.append(''.join([part.text for part in response.parts if hasattr(part, 'text')]))
+            elif hasattr(response, 'candidates') and len(response.candidates) > 0:
+                parts = response.candidates[0].content.parts
+                extracted_texts.append(''.join([part.text for part in parts if hasattr(part, 'text')]))
+            elif hasattr(response, 'text'):
+                extracted_texts.append(response.text)
+            else:
+                # Fallback
+                extracted_texts.append(str(response))
+
+        except Exception as e:
+            logger.exception("Error processing financial batch: %s", e)
+            # Fallback to individual processing
+            for img in batch:
+                single_response = self.model.generate_content([instruction, img])
+
+                # Handle single response the same way
+                if hasattr(single_response, 'parts'):
+                    extracted_texts.append(''.join([part.text for part in single_response.parts if hasattr(part, 'text')]))
+                elif hasattr(single_response, 'candidates') and len(single_response.candidates) > 0:
+                    parts = single_response.candidates[0].content.parts
+                    extracted_texts.append(''.join([part.text for part in parts if hasattr(part, 'text')]))
+                elif hasattr(single_response, 'text'):
+                    extracted_texts.append(single_response.text)
+                else:
+                    extracted_texts.append(str(single_response))
+
+        return "\n\n".join(extracted_texts)
+
     def process_financial_document(self, file_content, file_type):
         """Special handling for financial documents"""
         if file_type == "pdf":
@@ -162,42 +203,11 @@ class DocumentProcessor:
             Format tables using markdown table syntax to preserve their structure.
             """
 
-            # Process in small batches
+            # Process in small batches, several at a time, keeping the pages in order
             batches = self.batch_images(images, batch_size=3)
-            extracted_texts = []
-
-            for batch in batches:
-                try:
-                    response = self.model.generate_content([instruction] + batch)
-
-                    # Properly handle the response
-                    if hasattr(response, 'parts'):
-                        extracted_texts.append(''.join([part.text for part in response.parts if hasattr(part, 'text')]))
-                    elif hasattr(response, 'candidates') and len(response.candidates) > 0:
-                        parts = response.candidates[0].content.parts
-                        extracted_texts.append(''.join([part.text for part in parts if hasattr(part, 'text')]))
-                    elif hasattr(response, 'text'):
-                        extracted_texts.append(response.text)
-                    else:
-                        # Fallback
-                        extracted_texts.append(str(response))
-
-                except Exception as e:
-                    print(f"Error processing financial batch: {e}")
-                    # Fallback to individual processing
-                    for img in batch:
-                        single_response = self.model.generate_content([instruction, img])
-
-                        # Handle single response the same way
-                        if hasattr(single_response, 'parts'):
-                            extracted_texts.append(''.join([part.text for part in single_response.parts if hasattr(part, 'text')]))
-                        elif hasattr(single_response, 'candidates') and len(single_response.candidates) > 0:
-                            parts = single_response.candidates[0].content.parts
-                            extracted_texts.append(''.join([part.text for part in parts if hasattr(part, 'text')]))
-                        elif hasattr(single_response, 'text'):
-                            extracted_texts.append(single_response.text)
-                        else:
-                            extracted_texts.append(str(single_response))
+            extracted_texts = ocr_pool.map(
+                lambda batch: self.process_financial_batch(instruction, batch), batches
+            )
 
             return "\n\n".join(extracted_texts)
         else:
@@ -1,10 +1,18 @@
+import logging
 import os
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from hashlib import blake2b
 from http import HTTPStatus
 
 import google.generativeai as genai
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from flask import Blueprint, jsonify, request
 
+from tasks.runner import queue_requested, queued_response, requires_auth_to_queue, submit_task
+
 from .bubble_chart import process_text_for_bubble_chart
 from .mind_map import generate_concept_map
 from .ocr_concept_map import process_drawing_for_concept_map
@@ -18,15 +26,90 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Create a blueprint for concept map generation routes
 concept_map_bp = Blueprint('concept_map', __name__, url_prefix='/api/concept-maps')
 
+logger = logging.getLogger(__name__)
+
+# Recent Gemini results keyed by (kind, input hash), plus the calls currently in flight
+_gemini_results = TTLCache(maxsize=512, ttl=300)
+_gemini_inflight = {}
+_gemini_lock = threading.Lock()
+
 
 # Initialize Gemini model
+@lru_cache(maxsize=1)
 def get_gemini_model():
-    """Initialize and return a Gemini model instance"""
+    """Return the shared Gemini model instance, configuring the client on first use"""
     genai.configure(api_key=GEMINI_API_KEY)
     return genai.GenerativeModel("gemini-2.0-flash")
 
 
+def coalesced(kind, content, compute):
+    """
+    Run compute() at most once for identical input: recent results are served from a TTL
+    cache and concurrent requests for the same input wait on the call already in flight.
+    Results carrying an "error" key are shared with waiters but not cached.
+    """
+    key = (kind, blake2b(content.encode()).hexdigest())
+    with _gemini_lock:
+        # A single lookup, the entry can expire between a membership test and the read
+        cached = _gemini_results.get(key)
+        if cached is not None:
+            return cached
+        future = _gemini_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _gemini_inflight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = compute()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        if not (isinstance(result, dict) and "error" in result):
+            with _gemini_lock:
+                _gemini_results[key] = result
+        return result
+    finally:
+        with _gemini_lock:
+            del _gemini_inflight[key]
+
+
+MAP_TYPES = frozenset({'mindmap', 'wordcloud', 'bubblechart'})
+
+
+def _generate_visualization(map_type, text):
+    """Generate the visualization for one of MAP_TYPES and build the /generate/ response body"""
+    model = get_gemini_model()
+    # Generate the appropriate visualization based on map type
+    if map_type == 'mindmap':
+        result = coalesced("mindmap", text, lambda: generate_concept_map(text, model, GEMINI_API_KEY))
+        # Ensure we're returning a properly formatted response
+        # The frontend expects either a data URL or a base64 string with format
+        return {
+            'image': result,  # This is already base64 encoded from generate_concept_map
+            'format': 'svg'
+        }
+    if map_type == 'wordcloud':
+        result = coalesced("wordcloud", text, lambda: process_text_for_wordcloud(text, model, GEMINI_API_KEY))
+        return {
+            'image': result['word_cloud'],
+            'concepts': result['concepts'],
+            'format': 'svg'
+        }
+    result = coalesced("bubblechart", text, lambda: process_text_for_bubble_chart(text, model))
+    return {
+        'image': result['bubble_chart'],
+        'concepts': result['concepts'],
+        'format': 'svg'
+    }
+
+
 @concept_map_bp.route('/generate/', methods=['POST'])
+@requires_auth_to_queue
 def generate_map():
     """Generate a concept map based on input text and map type"""
     try:
@@ -44,41 +127,17 @@ def generate_map():
             return jsonify({
                 'error': 'Text content cannot be empty'
             }), HTTPStatus.BAD_REQUEST
-        # Initialize Gemini model
-        try:
-            model = get_gemini_model()
-        except ValueError as e:
-            return jsonify({
-                'error': str(e)
-            }), HTTPStatus.INTERNAL_SERVER_ERROR
-        # Generate the appropriate visualization based on map type
-        if map_type == 'mindmap':
-            result = generate_concept_map(text, model, GEMINI_API_KEY)
-            # Ensure we're returning a properly formatted response
-            # The frontend expects either a data URL or a base64 string with format
-            return jsonify({
-                'image': result,  # This is already base64 encoded from generate_concept_map
-                'format': 'svg'
-            })
-        elif map_type == 'wordcloud':
-            result = process_text_for_wordcloud(text, model, GEMINI_API_KEY)
-            return jsonify({
-                'image': result['word_cloud'],
-                'concepts': result['concepts'],
-                'format': 'svg'
-            })
-        elif map_type == 'bubblechart':
-            result = process_text_for_bubble_chart(text, model)
-            return jsonify({
-                'image': result['bubble_chart'],
-                'concepts': result['concepts'],
-                'format': 'svg'
-            })
-        else:
+        if map_type not in MAP_TYPES:
             return jsonify({
                 'error': f'Unsupported map type: {map_type}'
             }), HTTPStatus.BAD_REQUEST
 
+        # Generation waits on Gemini, clients can have it run in the background instead
+        if queue_requested():
+            return queued_response(submit_task("generate_map", _generate_visualization, map_type, text))
+
+        return jsonify(_generate_visualization(map_type, text))
+
     except Exception as e:
         return jsonify({
             'error': f'Error generating concept map: {str(e)}'
@@ -105,17 +164,11 @@ def extract_concepts():
                 'error': 'Text content cannot be empty'
             }), HTTPStatus.BAD_REQUEST
 
-        # Initialize Gemini model
-        try:
-            model = get_gemini_model()
-        except ValueError as e:
-            return jsonify({
-                'error': str(e)
-            }), HTTPStatus.INTERNAL_SERVER_ERROR
+        model = get_gemini_model()
 
         # Extract concepts using the word cloud module's function
         from .word_cloud import extract_concepts_from_text
-        concepts = extract_concepts_from_text(text, model)
+        concepts = coalesced("concepts", text, lambda: extract_concepts_from_text(text, model))
 
         return jsonify({
             'concepts': concepts
@@ -131,12 +184,12 @@ def extract_concepts():
 def process_drawing():
     """Process a drawing (SVG or PNG) to extract concepts and generate a digital concept map"""
     try:
-        print("*** Process Drawing API called ***")
+        logger.debug("Process drawing API called")
         data = request.json
 
         # Validate request data - accept either svgContent or imageContent
         if not data:
-            print("Missing request data")
+            logger.debug("Missing request data")
             return jsonify({
                 'error': 'Missing request data'
             }), HTTPStatus.BAD_REQUEST
@@ -144,11 +197,11 @@ def process_drawing():
         # Check if we have image content (PNG, JPEG, etc.)
         if 'imageContent' in data:
             image_content = data['imageContent']
-            print(f"Received image content length: {len(image_content)}")
+            logger.debug("Received image content length: %d", len(image_content))
 
             # Check if content is provided
             if not image_content.strip():
-                print("Image content is empty")
+                logger.debug("Image content is empty")
                 return jsonify({
                     'error': 'Image content cannot be empty'
                 }), HTTPStatus.BAD_REQUEST
@@ -157,64 +210,47 @@ def process_drawing():
             image_format = data.get('format', '').lower()
             prevent_jpeg = data.get('preventJpegConversion', False)
 
-            print(f"Image format: {image_format}, Prevent JPEG conversion: {prevent_jpeg}")
+            logger.debug("Image format: %s, Prevent JPEG conversion: %s", image_format, prevent_jpeg)
 
-            # For PNG data URLs, we can now pass them directly to the OCR function
-            if image_content.startswith('data:image/png') or image_format == 'png':
-                print("Direct PNG processing")
-                svg_content = image_content  # Pass the PNG data URL directly
-            else:
-                # For compatibility, convert image data URL to SVG format our backend expects
-                print("Creating SVG wrapper for image")
-                svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" width="800" height="600"><image href="{image_content}" width="800" height="600"/></svg>'
-
-            print(f"Prepared content for processing, length: {len(svg_content)}")
+            # The OCR pipeline decodes raster data URLs itself, so pass the upload through as-is
+            # rather than wrapping a second copy of it in an SVG <image> element
+            svg_content = image_content
 
         # Check for SVG content (backwards compatibility)
         elif 'svgContent' in data:
             svg_content = data['svgContent']
-            print(f"Received SVG content length: {len(svg_content)}")
+            logger.debug("Received SVG content length: %d", len(svg_content))
 
             # Check if content is provided
             if not svg_content.strip():
-                print("SVG content is empty")
+                logger.debug("SVG content is empty")
                 return jsonify({
                     'error': 'SVG content cannot be empty'
                 }), HTTPStatus.BAD_REQUEST
         else:
-            print("Missing required field: imageContent or svgContent")
+            logger.debug("Missing required field: imageContent or svgContent")
             return jsonify({
                 'error': 'Missing required field: imageContent or svgContent'
             }), HTTPStatus.BAD_REQUEST
 
-        # Initialize Gemini model
-        try:
-            print("Initializing Gemini model")
-            model = get_gemini_model()
-        except ValueError as e:
-            print(f"Error initializing Gemini model: {str(e)}")
-            return jsonify({
-                'error': str(e)
-            }), HTTPStatus.INTERNAL_SERVER_ERROR
+        model = get_gemini_model()
 
         # Process the drawing with OCR and generate concept map
-        print("Processing drawing with OCR")
-        result = process_drawing_for_concept_map(svg_content, model)
+        logger.debug("Processing drawing with OCR")
+        result = coalesced("drawing", svg_content, lambda: process_drawing_for_concept_map(svg_content, model))
 
         # Check if there was an error during processing
         if 'error' in result:
-            print(f"Error processing drawing: {result['error']}")
+            logger.error("Error processing drawing: %s", result['error'])
             return jsonify({
                 'error': result['error']
             }), HTTPStatus.INTERNAL_SERVER_ERROR
 
-        print(f"OCR processing successful with {len(result.get('concepts', []))} concepts")
+        logger.debug("OCR processing successful with %d concepts", len(result.get('concepts', [])))
         return jsonify(result)
 
     except Exception as e:
-        print(f"Exception in process_drawing route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Exception in process_drawing route: %s", e)
         return jsonify({
             'error': f'Error processing drawing: {str(e)}'
         }), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -235,28 +271,25 @@ def debug_visualize_concepts():
         # Import the function to generate SVG
         from .mind_map import generate_concept_map_svg
 
-        # Build the concept map structure
-        concept_map = {"nodes": [], "edges": []}
-
-        # Add nodes from the provided concepts
-        for concept in data["concepts"]:
-            concept_map["nodes"].append(
+        # Build the concept map structure from the provided concepts and relationships
+        concept_map = {
+            "nodes": [
                 {
                     "id": concept.get("id"),
                     "label": concept.get("name"),
                     "description": concept.get("description", ""),
                 }
-            )
-
-        # Add edges from the provided relationships
-        for rel in data["relationships"]:
-            concept_map["edges"].append(
+                for concept in data["concepts"]
+            ],
+            "edges": [
                 {
                     "source": rel.get("source"),
                     "target": rel.get("target"),
                     "label": rel.get("label", "relates to"),
                 }
-            )
+                for rel in data["relationships"]
+            ],
+        }
 
         # Generate the SVG
         layout_style = data.get("structure", {}).get("type", "hierarchical")
@@ -264,19 +297,18 @@ def debug_visualize_concepts():
             layout_style = "hierarchical"
 
         # Debug the concept map structure
-        print("DEBUG: Concept map structure before SVG generation:")
-        print(f"DEBUG: Type of concept_map: {type(concept_map)}")
-        print(f"DEBUG: Keys in concept_map: {concept_map.keys()}")
-        print(f"DEBUG: Number of nodes: {len(concept_map['nodes'])}")
-        print(f"DEBUG: Number of edges: {len(concept_map['edges'])}")
-        if concept_map["nodes"]:
-            print(f"DEBUG: First node: {concept_map['nodes'][0]}")
-        if concept_map["edges"]:
-            print(f"DEBUG: First edge: {concept_map['edges'][0]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Concept map structure before SVG generation:")
+            logger.debug("Number of nodes: %d", len(concept_map["nodes"]))
+            logger.debug("Number of edges: %d", len(concept_map["edges"]))
+            if concept_map["nodes"]:
+                logger.debug("First node: %s", concept_map["nodes"][0])
+            if concept_map["edges"]:
+                logger.debug("First edge: %s", concept_map["edges"][0])
 
         # Ensure the concept map structure is valid
         if not concept_map["nodes"] or not concept_map["edges"]:
-            print("WARNING: Empty nodes or edges list, creating placeholder")
+            logger.warning("Empty nodes or edges list, creating placeholder")
             # Add placeholder node and edge if needed
             if not concept_map["nodes"]:
                 concept_map["nodes"].append(
@@ -309,5 +341,5 @@ def debug_visualize_concepts():
         )
 
     except Exception as e:
-        print(f"Error visualizing concepts: {str(e)}")
+        logger.error("Error visualizing concepts: %s", e)
         return jsonify({'error': f'Failed to visualize concepts: {str(e)}'}), HTTPStatus.INTERNAL_SERVER_ERROR
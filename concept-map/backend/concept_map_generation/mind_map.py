@@ -2,6 +2,7 @@ import base64
 import json
 import logging
 import re
+from functools import lru_cache
 from typing import List, Tuple, Dict, Any
 
 import google.generativeai as genai
@@ -353,6 +354,10 @@ def add_node(dot, node_id, label=None, node_attrs=None, added_nodes=None):
     return actual_id
 
 
+CAUSAL_RELATIONS = ("cause", "result", "lead to", "produce")
+COMPOSITION_RELATIONS = ("part", "component", "contain")
+
+
 def build_graph(concept_data, layout_style="hierarchical"):
     """
     Build the concept map graph from the given concept data.
@@ -456,27 +461,34 @@ def build_graph(concept_data, layout_style="hierarchical"):
                             for child_id in child_ids:
                                 s.node(child_id)
 
-                    # Connect parent to all children with this relation
-                    for child_id in child_ids:
-                        # Edge styling
-                        edge_style = {
-                            "color": "#555555",
-                            "penwidth": "1.0",
-                            "fontsize": "11",
-                            "fontname": "Arial"
-                        }
+                    # Edge styling, shared by every child under this relation
+                    edge_style = {
+                        "color": "#555555",
+                        "penwidth": "1.0",
+                        "fontsize": "11",
+                        "fontname": "Arial"
+                    }
 
-                        # Special styling for certain relationship types
-                        if any(rel in relation.lower() for rel in ["cause", "result", "lead to", "produce"]):
-                            edge_style["color"] = "#E74C3C"  # Red for causation
-                        elif any(rel in relation.lower() for rel in ["part", "component", "contain"]):
-                            edge_style["style"] = "dashed"  # Dashed for composition
+                    # Special styling for certain relationship types
+                    relation_lower = relation.lower()
+                    if any(rel in relation_lower for rel in CAUSAL_RELATIONS):
+                        edge_style["color"] = "#E74C3C"  # Red for causation
+                    elif any(rel in relation_lower for rel in COMPOSITION_RELATIONS):
+                        edge_style["style"] = "dashed"  # Dashed for composition
 
+                    # Connect parent to all children with this relation
+                    for child_id in child_ids:
                         dot.edge(parent_id, child_id, label=relation, **edge_style)
 
     return dot
 
 
+@lru_cache(maxsize=128)
+def render_svg(source: str) -> bytes:
+    """Lay out and render DOT source to SVG with Graphviz, the slow step of drawing a map."""
+    return graphviz.pipe("dot", "svg", source.encode("utf-8"))
+
+
 def generate_concept_map_svg(concept_map_json: Dict[str, Any], layout_style: str = "hierarchical") -> str:
     """
     Generate an SVG representation of a concept map from JSON data.
@@ -507,8 +519,8 @@ def generate_concept_map_svg(concept_map_json: Dict[str, Any], layout_style: str
         # Build the graph
         dot = build_graph(concept_data, layout_style)
 
-        # Render the graph to SVG
-        svg_data = dot.pipe()
+        # Render the graph to SVG, identical graphs reuse the last rendering
+        svg_data = render_svg(dot.source)
         if not svg_data:
             raise ValueError("Empty SVG output")
 
@@ -539,19 +551,13 @@ def generate_concept_map(input_text: str, model: genai.GenerativeModel, api_key:
     Args:
         input_text (str): The input text to generate the concept map from.
         model (genai.GenerativeModel): An instance of the Gemini model.
-        api_key (str): The Gemini API key.
+        api_key (str): Unused, the model passed in is already configured.
         layout_style (str): The layout algorithm to use ('hierarchical', 'radial', 'network')
         
     Returns:
         str: Base64 encoded SVG representation of the concept map.
     """
     try:
-        # Setup Gemini API
-        setup_gemini(api_key)
-
-        # Create a model instance
-        model = genai.GenerativeModel("gemini-2.0-flash")
-
         # Handle empty or very short input
         if not input_text or len(input_text.strip()) < 5:
             logger.warning("Input text is empty or too short")
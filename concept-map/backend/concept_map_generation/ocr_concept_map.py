@@ -11,6 +11,11 @@ from PIL import Image
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Raster data URLs that PIL can open directly, without going through an SVG renderer
+RASTER_DATA_URL_PREFIXES = tuple(
+    f"data:image/{image_type};base64," for image_type in ("png", "jpeg", "jpg", "webp", "gif")
+)
+
 
 def process_svg_for_ocr(svg_content: str) -> Image.Image:
     """
@@ -29,18 +34,19 @@ def process_svg_for_ocr(svg_content: str) -> Image.Image:
         logger.info(f"Processing SVG content of length: {len(svg_content)}")
 
         # Log the start of the SVG to debug
-        svg_preview = svg_content[:100].replace('\n', ' ') + "..."
-        logger.info(f"SVG content preview: {svg_preview}")
+        if logger.isEnabledFor(logging.DEBUG):
+            svg_preview = svg_content[:100].replace('\n', ' ') + "..."
+            logger.debug(f"SVG content preview: {svg_preview}")
 
-        # Check if it's already a PNG data URL
-        if svg_content.startswith('data:image/png;base64,'):
-            logger.info("Detected PNG data URL, processing directly")
+        # Check if it's already a raster data URL
+        if svg_content.startswith(RASTER_DATA_URL_PREFIXES):
+            logger.info("Detected raster data URL, processing directly")
             try:
                 # Extract the base64 content
                 encoded = svg_content.split(',', 1)[1]
-                png_bytes = base64.b64decode(encoded)
-                img = Image.open(io.BytesIO(png_bytes))
-                logger.info(f"Successfully loaded PNG directly, size: {img.size}")
+                image_bytes = base64.b64decode(encoded)
+                img = Image.open(io.BytesIO(image_bytes))
+                logger.info(f"Successfully loaded image directly, size: {img.size}")
 
                 # Convert to RGB mode if it has alpha channel to avoid JPEG conversion issues
                 if img.mode == 'RGBA':
@@ -51,7 +57,7 @@ def process_svg_for_ocr(svg_content: str) -> Image.Image:
 
                 return img
             except Exception as e:
-                logger.error(f"Failed to process PNG data URL: {str(e)}")
+                logger.error(f"Failed to process raster data URL: {str(e)}")
                 # Continue to other methods
 
         # Handle data URLs
@@ -372,6 +378,11 @@ def extract_concepts_and_relations_from_image(image: Image.Image, model: genai.G
         }
 
 
+def _simple_label(label: str) -> str:
+    """Use simple relationship labels, complex ones (more than 3 words) become "relates to"."""
+    return "relates to" if len(label.split()) > 3 else label
+
+
 def generate_mind_map_from_ocr_results(ocr_data: Dict[str, Any], model: genai.GenerativeModel) -> str:
     """
     Generate a simplified mind map from OCR-extracted concept data.
@@ -393,32 +404,25 @@ def generate_mind_map_from_ocr_results(ocr_data: Dict[str, Any], model: genai.Ge
 
         # Build the concept map JSON structure expected by generate_concept_map_svg
         concept_map = {
-            "nodes": [],
-            "edges": []
+            "nodes": [
+                {
+                    "id": concept["id"],
+                    "label": concept["name"],
+                    "description": concept.get("description", "")
+                }
+                for concept in concepts
+            ],
+            # Add edges with simplified relationships
+            "edges": [
+                {
+                    "source": rel["source"],
+                    "target": rel["target"],
+                    "label": _simple_label(rel.get("label", "relates to"))
+                }
+                for rel in relationships
+            ]
         }
 
-        # Add nodes
-        for concept in concepts:
-            concept_map["nodes"].append({
-                "id": concept["id"],
-                "label": concept["name"],
-                "description": concept.get("description", "")
-            })
-
-        # Add edges with simplified relationships
-        for rel in relationships:
-            # Use simple relationship labels
-            label = rel.get("label", "relates to")
-            # If the label is complex (more than 3 words), simplify it
-            if len(label.split()) > 3:
-                label = "relates to"
-
-            concept_map["edges"].append({
-                "source": rel["source"],
-                "target": rel["target"],
-                "label": label
-            })
-
         # Use network layout for simpler visualization
         layout_style = "network"
 
@@ -442,14 +446,14 @@ def process_drawing_for_concept_map(svg_content: str, model: genai.GenerativeMod
         Dict: A dictionary with the extracted data and generated concept map
     """
     try:
-        # If it's a PNG data URL, convert directly to image
-        if svg_content.startswith('data:image/png;base64,'):
-            logger.info("Direct processing of PNG data URL")
+        # If it's a raster data URL (PNG, JPEG, ...), decode it directly to an image
+        if svg_content.startswith(RASTER_DATA_URL_PREFIXES):
+            logger.info("Direct processing of raster data URL")
             try:
                 # Extract the base64 content
                 encoded = svg_content.split(',', 1)[1]
-                png_bytes = base64.b64decode(encoded)
-                img = Image.open(io.BytesIO(png_bytes))
+                image_bytes = base64.b64decode(encoded)
+                img = Image.open(io.BytesIO(image_bytes))
 
                 # Ensure we're in RGB mode to avoid JPEG conversion issues
                 if img.mode == 'RGBA':
@@ -458,9 +462,9 @@ def process_drawing_for_concept_map(svg_content: str, model: genai.GenerativeMod
                     background.paste(img, mask=img.split()[3])  # 3 is the alpha channel
                     img = background
 
-                logger.info(f"Successfully loaded PNG directly, size: {img.size}")
+                logger.info(f"Successfully loaded image directly, size: {img.size}")
             except Exception as e:
-                logger.error(f"Error processing PNG directly: {str(e)}")
+                logger.error(f"Error processing image directly: {str(e)}")
                 # Fall back to SVG conversion method
                 img = process_svg_for_ocr(svg_content)
         else:
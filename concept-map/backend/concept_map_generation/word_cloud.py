@@ -8,7 +8,6 @@ import matplotlib
 matplotlib.use('Agg')  # Force non-interactive backend before importing pyplot
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
-import google.generativeai as genai
 
 
 def load_key_concepts(gemini_json_output):
@@ -133,11 +132,6 @@ def process_text_for_wordcloud(text, model, api_key=None):
     """Process text and generate word cloud with key concepts."""
     try:
         print("Starting wordcloud generation process")
-        # Configure Gemini API if API key is provided
-        if api_key:
-            print("Configuring Gemini API with provided key")
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.0-flash")
 
         # Extract key concepts using Gemini
         print("Extracting key concepts from text using Gemini")
@@ -1,97 +1,108 @@
+import logging
 import os
-from datetime import datetime
+import threading
 from http import HTTPStatus
 
-from flask import Blueprint, request, jsonify
+import orjson
+from cachetools import TTLCache
+from flask import Blueprint, Response, g, request, jsonify
 
 debug_bp = Blueprint("debug", __name__)
 
+logger = logging.getLogger(__name__)
+
+# Encoded Gemini model catalog, refetched at most once an hour
+_model_catalog = TTLCache(maxsize=1, ttl=3600)
+_model_catalog_lock = threading.Lock()
+
+# The mock OCR response, the same for every drawing
+_MOCK_SKELETON = {
+    "concepts": [
+        {
+            "id": "c1",
+            "name": "Mock Concept 1",
+            "description": "This is a mock concept",
+        },
+        {
+            "id": "c2",
+            "name": "Mock Concept 2",
+            "description": "Another mock concept",
+        },
+    ],
+    "relationships": [{"source": "c1", "target": "c2", "label": "relates to"}],
+    "format": "svg",
+    "structure": {"type": "hierarchical", "root": "c1"},
+}
+
 
 @debug_bp.route("/api/debug/process-drawing/", methods=["POST"])
 def debug_process_drawing():
     """Debug endpoint for drawing processing that always returns valid data"""
-    print("DEBUG: Process drawing API called")
+    logger.debug("Process drawing API called")
     data = request.json
 
-    # Log received data
-    image_content = None
-    svg_content = None
-
     if data:
         if "imageContent" in data:
             image_content = data["imageContent"]
-            content_preview = (
-                image_content[:50] + "..." if len(image_content) > 50 else image_content
-            )
-            print(f"DEBUG: Received image content length: {len(image_content)}")
-            print(f"DEBUG: Image content preview: {content_preview}")
-
-            # For compatibility with our mock response, create a minimal SVG wrapper
-            svg_content = f'<svg xmlns="http://www.w3.org/2000/svg" width="800" height="600"><image href="{image_content}" width="800" height="600"/></svg>'
+            if logger.isEnabledFor(logging.DEBUG):
+                content_preview = (
+                    image_content[:50] + "..." if len(image_content) > 50 else image_content
+                )
+                logger.debug("Received image content length: %d", len(image_content))
+                logger.debug("Image content preview: %s", content_preview)
         elif "svgContent" in data:
             svg_content = data["svgContent"]
-            content_preview = (
-                svg_content[:100] + "..." if len(svg_content) > 100 else svg_content
-            )
-            print(f"DEBUG: Received SVG content length: {len(svg_content)}")
-            print(f"DEBUG: SVG content preview: {content_preview}")
+            if logger.isEnabledFor(logging.DEBUG):
+                content_preview = (
+                    svg_content[:100] + "..." if len(svg_content) > 100 else svg_content
+                )
+                logger.debug("Received SVG content length: %d", len(svg_content))
+                logger.debug("SVG content preview: %s", content_preview)
         else:
-            print("DEBUG: No image or SVG content received")
+            logger.debug("No image or SVG content received")
             return jsonify({"error": "No image or SVG content provided"}), HTTPStatus.BAD_REQUEST
     else:
-        print("DEBUG: No data received")
+        logger.debug("No data received")
         return jsonify({"error": "No data provided"}), HTTPStatus.BAD_REQUEST
 
-    # Create a mock OCR response
-    mock_response = {
-        "concepts": [
-            {
-                "id": "c1",
-                "name": "Mock Concept 1",
-                "description": "This is a mock concept",
-            },
-            {
-                "id": "c2",
-                "name": "Mock Concept 2",
-                "description": "Another mock concept",
-            },
-        ],
-        "relationships": [{"source": "c1", "target": "c2", "label": "relates to"}],
-        "image": svg_content,  # Return the original SVG content
-        "format": "svg",
-        "structure": {"type": "hierarchical", "root": "c1"},
-    }
-
-    # Return the mock response for testing
-    print("DEBUG: Returning mock OCR response")
-    return jsonify(mock_response)
+    # Return the mock response for testing, the drawing itself is never echoed back
+    logger.debug("Returning mock OCR response")
+    return jsonify(_MOCK_SKELETON)
+
+
+def fetch_model_catalog():
+    """List the available Gemini models, encoded as the endpoint's JSON body."""
+    import google.generativeai as genai
+
+    model_info = [
+        {
+            "name": model.name,
+            "display_name": model.display_name,
+            "description": model.description,
+            "input_text": "text" in model.supported_generation_methods,
+            "input_image": hasattr(model, "input_image") and model.input_image,
+        }
+        for model in genai.list_models()
+    ]
+    return orjson.dumps({"models": model_info, "count": len(model_info)})
 
 
 # Add debug endpoint to list available Gemini models
 @debug_bp.route("/api/debug/list-models/", methods=["GET"])
 def list_models():
     """Debug endpoint to list available Gemini models"""
-    import google.generativeai as genai
-
     try:
-        print("DEBUG: Listing available Gemini models")
-        models = genai.list_models()
-        model_info = []
-
-        for model in models:
-            model_info.append(
-                {
-                    "name": model.name,
-                    "display_name": model.display_name,
-                    "description": model.description,
-                    "input_text": "text" in model.supported_generation_methods,
-                    "input_image": hasattr(model, "input_image") and model.input_image,
-                }
-            )
-
-        return jsonify({"models": model_info, "count": len(model_info)})
+        # The catalog rarely changes, so only ask Google for it once an hour
+        with _model_catalog_lock:
+            body = _model_catalog.get("models")
+            if body is None:
+                logger.debug("Listing available Gemini models")
+                body = _model_catalog["models"] = fetch_model_catalog()
+
+        # Let clients and proxies reuse the catalog for as long as the server does
+        return Response(body, mimetype="application/json", headers={"Cache-Control": "public, max-age=3600"})
     except Exception as e:
-        print(f"DEBUG: Error listing models: {str(e)}")
+        logger.error("Error listing models: %s", e)
         return jsonify({"error": f"Failed to list models: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 
@@ -106,13 +117,13 @@ def test_get_concept_maps():
                 "name": "Test Map",
                 "user_id": 1,
                 "is_public": True,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat(),
+                "created_at": g.request_time,
+                "updated_at": g.request_time,
                 "nodes": [],
                 "edges": [],
                 "format": "mindmap",
             }
         ]), 200
     except Exception as e:
-        print(f"Error in test_get_concept_maps: {str(e)}")
+        logger.error("Error in test_get_concept_maps: %s", e)
         return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
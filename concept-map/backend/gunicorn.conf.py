@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for running the API in production.
+
+Usage: gunicorn app:app
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+# One worker process per core by default; threads below cover the I/O waits
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 4))
+
+# Load the application once in the master process so expensive startup work
+# (e.g. the document processor) is shared with the workers instead of being
+# repeated in each of them.
+preload_app = True
+
+# Most request time is spent waiting on Gemini, so serve requests from a pool
+# of threads per worker; a thread blocked on an outbound call no longer ties
+# up the whole worker process.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# Generation and document processing calls can legitimately take longer than
+# gunicorn's 30 second default
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# Keep connections from the reverse proxy open between requests
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
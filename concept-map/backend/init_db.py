@@ -1,9 +1,40 @@
-from app import app, db
+"""
+Create the tables of a fresh database and mark it as up to date with the migrations.
+The migration chain starts from an existing users table, so it can't build an empty
+database by itself; once initialized here, schema changes go through `flask db upgrade`.
+"""
+import os
 
-# The app is already configured to use the SQLite database file
-# as defined in app.py with: app.config["SQLALCHEMY_DATABASE_URI"]
+from flask_migrate import stamp
+from sqlalchemy import inspect
 
-with app.app_context():
-    db.create_all()
-    print("Database tables created successfully!")
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def init_database(app):
+    """Create the tables if the database is empty, returning whether it was."""
+    with app.app_context():
+        try:
+            # Only stamp an empty database, an older schema still needs its migrations applied
+            if inspect(db.engine).get_table_names():
+                return False
+
+            db.create_all()
+            stamp(directory=MIGRATIONS_DIR)
+            return True
+        finally:
+            # This can run in the gunicorn master before it forks (preload_app), so don't
+            # leave pooled connections behind for the workers to share
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    from app import app
+
+    if init_database(app):
+        print("Database tables created successfully!")
+    else:
+        print("Database already has tables, apply schema changes with `flask db upgrade`")
     print(f"Using database: {app.config['SQLALCHEMY_DATABASE_URI']}")
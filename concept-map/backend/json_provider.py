@@ -0,0 +1,27 @@
+"""
+Flask JSON provider backed by orjson, used for all jsonify() responses.
+Datetimes are left for orjson to format natively, its output matches datetime.isoformat().
+"""
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize with orjson, falling back to Flask's defaults for types orjson doesn't know."""
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Hand the encoded bytes straight to the response instead of going through str
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype,
+        )
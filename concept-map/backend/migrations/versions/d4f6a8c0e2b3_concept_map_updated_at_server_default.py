@@ -0,0 +1,44 @@
+"""Let the database set concept_maps.updated_at
+
+Revision ID: d4f6a8c0e2b3
+Revises: b2e4d6f8a0c1
+Create Date: 2026-10-15 16:02:11.734105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6a8c0e2b3'
+down_revision = 'b2e4d6f8a0c1'
+branch_labels = None
+depends_on = None
+
+
+def utcnow_default():
+    """Database expression for the current UTC time, matching models.db_utcnow."""
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        return sa.text("timezone('utc', CURRENT_TIMESTAMP)")
+    if dialect == 'sqlite':
+        return sa.text("(strftime('%Y-%m-%d %H:%M:%f', 'now'))")
+    if dialect == 'mysql':
+        return sa.text("(UTC_TIMESTAMP(6))")
+    return sa.text("CURRENT_TIMESTAMP")
+
+
+def upgrade():
+    with op.batch_alter_table('concept_maps', schema=None) as batch_op:
+        batch_op.alter_column('updated_at',
+               existing_type=sa.DateTime(),
+               server_default=utcnow_default(),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('concept_maps', schema=None) as batch_op:
+        batch_op.alter_column('updated_at',
+               existing_type=sa.DateTime(),
+               server_default=None,
+               existing_nullable=True)
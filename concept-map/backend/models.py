@@ -1,16 +1,63 @@
 """
 Models for the concept map application.
-Currently using in-memory storage, but structured to easily migrate to a database.
+Everything is stored in the database through Flask-SQLAlchemy, schema changes go through migrations/.
 """
 
-from datetime import datetime
+import secrets
+from datetime import datetime, timezone
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
 
 
+def utc_now():
+    """Return the current UTC time as a naive datetime, matching the stored timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class db_utcnow(FunctionElement):
+    """Current UTC time as a naive timestamp, evaluated by the database."""
+
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(db_utcnow)
+def _db_utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(db_utcnow, "postgresql")
+def _db_utcnow_postgresql(element, compiler, **kw):
+    return "timezone('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(db_utcnow, "sqlite")
+def _db_utcnow_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP only has second precision in SQLite, keep the milliseconds for ETags
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+@compiles(db_utcnow, "mysql")
+def _db_utcnow_mysql(element, compiler, **kw):
+    return "UTC_TIMESTAMP(6)"
+
+
+def generate_share_id():
+    """Generate a random, URL-safe ID used to share a concept map or note."""
+    return secrets.token_urlsafe(8)
+
+
+def generate_task_id():
+    """Generate a random, unguessable ID for a background task."""
+    return secrets.token_hex(16)
+
+
 class User(db.Model):
     """Model representing a user in the application."""
 
@@ -26,9 +73,9 @@ class User(db.Model):
     display_name = db.Column(db.String(100), nullable=False)
     bio = db.Column(db.Text, nullable=True)
     avatar_url = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utc_now)
     updated_at = db.Column(
-        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+        db.DateTime, default=utc_now, onupdate=utc_now
     )
     is_active = db.Column(db.Boolean, default=True)
 
@@ -52,8 +99,7 @@ class User(db.Model):
         self.display_name = display_name or email.split('@')[0]
         self.bio = bio
         self.avatar_url = avatar_url
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self.created_at = self.updated_at = utc_now()
         self.is_active = True
 
     def update_profile(self, display_name=None, bio=None, avatar_url=None):
@@ -64,12 +110,12 @@ class User(db.Model):
             self.bio = bio
         if avatar_url is not None:  # Allow setting to None to remove avatar
             self.avatar_url = avatar_url
-        self.updated_at = datetime.utcnow()
+        self.updated_at = utc_now()
 
     def deactivate(self):
         """Soft delete the user account by marking it as inactive."""
         self.is_active = False
-        self.updated_at = datetime.utcnow()
+        self.updated_at = utc_now()
 
     def to_dict(self):
         """Convert the model to a dictionary representation (excluding password)."""
@@ -79,8 +125,8 @@ class User(db.Model):
             "displayName": self.display_name,
             "bio": self.bio,
             "avatarUrl": self.avatar_url,
-            "createdAt": self.created_at.isoformat() if self.created_at else None,
-            "updatedAt": self.updated_at.isoformat() if self.updated_at else None,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
             "isActive": self.is_active,
         }
 
@@ -186,12 +232,13 @@ class ConceptMap(db.Model):
         nullable=False,
     )
     is_public = db.Column(db.Boolean, default=False)
-    share_id = db.Column(db.String(50), nullable=True)
-    is_favorite = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(
-        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    share_id = db.Column(
+        db.String(50), nullable=True, unique=True, index=True, default=generate_share_id
     )
+    is_favorite = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    # Set by the database in the INSERT/UPDATE itself
+    updated_at = db.Column(db.DateTime, server_default=db_utcnow(), onupdate=db_utcnow())
     image = db.Column(db.Text, nullable=True)
     format = db.Column(db.String(10), nullable=True)
     input_text = db.Column(db.Text, nullable=True)
@@ -200,6 +247,17 @@ class ConceptMap(db.Model):
     is_deleted = db.Column(db.Boolean, default=False)
     whiteboard_content = db.Column(db.JSON, nullable=True)  # Added for storing hand-drawn whiteboard content
 
+    __table_args__ = (
+        # Serves the per-user "live maps, most recently updated first" listings
+        db.Index(
+            "ix_concept_maps_user_id_is_deleted_updated_at",
+            user_id,
+            is_deleted,
+            updated_at.desc(),
+            postgresql_include=["name"],
+        ),
+    )
+
     # Relationships
     nodes = db.relationship(
         "Node", backref="concept_map", lazy=True, cascade="all, delete-orphan"
@@ -208,6 +266,11 @@ class ConceptMap(db.Model):
         "Edge", backref="concept_map", lazy=True, cascade="all, delete-orphan"
     )
 
+    @property
+    def image_url(self):
+        """Path of the endpoint serving this map's image as raw bytes, if it has one."""
+        return f"/api/concept-maps/{self.id}/image/" if self.image else None
+
     def to_dict(self):
         """Convert the model to a dictionary representation."""
         return {
@@ -218,9 +281,10 @@ class ConceptMap(db.Model):
             "user_id": self.user_id,
             "is_public": self.is_public,
             "share_id": self.share_id,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
             "image": self.image,
+            "image_url": self.image_url,
             "format": self.format,
             "whiteboard_content": self.whiteboard_content,
             "learning_objective": self.learning_objective,  # Add this line
@@ -229,6 +293,22 @@ class ConceptMap(db.Model):
             "input_text": self.input_text,  # Add input_text
         }
 
+    def to_list_dict(self):
+        """Convert the model to the light representation used when listing maps."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "user_id": self.user_id,
+            "is_public": self.is_public,
+            "share_id": self.share_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "format": self.format,
+            "learning_objective": self.learning_objective,
+            "description": self.description,
+            "is_favorite": self.is_favorite,
+        }
+
     @classmethod
     def from_dict(cls, data, map_id=None):
         """Create a ConceptMap instance from a dictionary."""
@@ -261,25 +341,89 @@ class ConceptMap(db.Model):
         )
 
 
-class Note:
+class Task(db.Model):
+    """Model tracking a unit of work run in the background, such as processing a document."""
+
+    __tablename__ = "tasks"
+
+    id = db.Column(db.String(32), primary_key=True, default=generate_task_id)
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE", name="fk_tasks_user_id"),
+        nullable=False,
+    )
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, running, succeeded, failed
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+
+    def to_dict(self):
+        """Convert the model to a dictionary representation."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class Note(db.Model):
     """Model representing a user's note."""
-    
-    def __init__(self, title, content, note_id=None, user_id=None, is_public=False, 
-                 share_id=None, created_at=None, updated_at=None, is_favorite=False, 
+
+    __tablename__ = "notes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(255), nullable=False)
+    content = db.Column(db.JSON, nullable=True)  # The BlockNote editor content
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE", name="fk_notes_user_id"),
+        nullable=False,
+    )
+    is_public = db.Column(db.Boolean, default=False)
+    share_id = db.Column(
+        db.String(50), nullable=True, unique=True, index=True, default=generate_share_id
+    )
+    is_favorite = db.Column(db.Boolean, default=False)
+    tags = db.Column(db.JSON, nullable=True)
+    description = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+    is_deleted = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        # Serves the per-user "live notes, most recently updated first" listings
+        db.Index(
+            "ix_notes_user_id_is_deleted_updated_at",
+            user_id,
+            is_deleted,
+            updated_at.desc(),
+        ),
+    )
+
+    def __init__(self, title, content, note_id=None, user_id=None, is_public=False,
+                 share_id=None, created_at=None, updated_at=None, is_favorite=False,
                  tags=None, description=None):
         self.id = note_id
         self.title = title
-        self.content = content  # This would store the BlockNote editor content as JSON
-        self.user_id = user_id  # To associate notes with users
-        self.is_public = is_public  # Whether the note is publicly accessible
-        self.share_id = share_id  # Unique ID for sharing the note
-        self.created_at = created_at or datetime.utcnow()
-        self.updated_at = updated_at or datetime.utcnow()
-        self.is_favorite = is_favorite  # Whether the note is marked as favorite
-        self.tags = tags or []  # List of tags for the note
-        self.description = description  # Brief description of the note
+        self.content = content
+        self.user_id = user_id
+        self.is_public = is_public
+        if share_id:
+            self.share_id = share_id
+        now = utc_now()
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+        self.is_favorite = is_favorite
+        self.tags = tags or []
+        self.description = description
         self.is_deleted = False  # For soft deletion
-    
+
     def to_dict(self):
         """Convert the model to a dictionary representation."""
         return {
@@ -289,14 +433,14 @@ class Note:
             "user_id": self.user_id,
             "is_public": self.is_public,
             "share_id": self.share_id,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
             "is_favorite": self.is_favorite,
             "tags": self.tags,
             "description": self.description,
             "is_deleted": self.is_deleted
         }
-    
+
     @classmethod
     def from_dict(cls, data, note_id=None):
         """Create a Note instance from a dictionary."""
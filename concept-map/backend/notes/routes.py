@@ -1,16 +1,62 @@
+import logging
 import os
-import secrets
-from datetime import datetime
 from http import HTTPStatus
 
-from flask import Blueprint, request, jsonify
+import msgspec
+from flask import Blueprint, g, request, jsonify
+from sqlalchemy import func, select
 
 from auth_utils import requires_auth, get_auth0_user
-from concept_map_generation.crud_routes import concept_maps
-from models import Note, ConceptMap
+from concept_map_generation.crud_routes import (
+    add_map_graph,
+    etag_version,
+    not_modified_response,
+    shared_json_response,
+    with_etag,
+)
+from concept_map_generation.generation_routes import get_gemini_model
+from concept_map_generation.mind_map import (
+    extract_triples_from_text,
+    generate_concept_map_json,
+    generate_concept_map_svg,
+)
+from models import Note, ConceptMap, db, generate_share_id
+from schemas import EdgeIn, NodeIn, NoteCreate, NoteUpdate, decode_request
+from tasks.runner import queue_requested, queued_response, submit_task
 
 notes_bp = Blueprint("notes", __name__, url_prefix='/api/notes')
-notes = []  # List to store note objects
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_NOTES = 500
+
+FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173").rstrip("/")
+SHARE_URL_PREFIX = f"{FRONTEND_URL}/shared/notes/"
+
+
+def _get_user_note(note_id, user):
+    """Look up a note by ID, returning None unless it belongs to the user and isn't deleted."""
+    return Note.query.filter_by(id=note_id, user_id=user.id, is_deleted=False).first()
+
+
+def _new_note(body, user):
+    """Build a note for the user from a decoded NoteCreate body."""
+    return Note(
+        title=body.title,
+        content=body.content,
+        user_id=user.id,
+        is_public=body.is_public,
+        created_at=g.request_time,
+        updated_at=g.request_time,
+        is_favorite=body.is_favorite,
+        tags=body.tags,
+        description=body.description,
+    )
+
+
+def live_notes(user_id):
+    """Query for the notes of a user that aren't deleted."""
+    return Note.query.filter_by(user_id=user_id, is_deleted=False)
 
 
 # Notes routes
@@ -20,9 +66,22 @@ def get_notes():
     """Get all notes for the current user."""
     user = get_auth0_user()
 
-    # Filter notes by user_id and not deleted
-    user_notes = [n.to_dict() for n in notes if n.user_id == user.id and not n.is_deleted]
-    return jsonify(user_notes), HTTPStatus.OK
+    # Any create, save, share or delete changes the number of notes or the latest update time
+    count, last_updated = db.session.execute(
+        select(func.count(Note.id), func.max(Note.updated_at)).where(
+            Note.user_id == user.id, Note.is_deleted.is_(False)
+        )
+    ).one()
+    etag = f"notes-{user.id}-{count}-{etag_version(last_updated)}"
+    not_modified = not_modified_response(etag, "private, must-revalidate")
+    if not_modified:
+        return not_modified
+
+    # Filter notes by user_id and not deleted, in creation order
+    user_notes = live_notes(user.id).order_by(Note.id).all()
+
+    response = jsonify([note.to_dict() for note in user_notes])
+    return with_etag(response, etag, "private, must-revalidate"), HTTPStatus.OK
 
 
 @notes_bp.route("/", methods=["POST"])
@@ -31,30 +90,43 @@ def create_note():
     """Create a new note."""
     user = get_auth0_user()
 
-    data = request.json
+    try:
+        body = decode_request(NoteCreate)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": "Invalid request body", "message": str(e)}), HTTPStatus.BAD_REQUEST
 
-    # Basic validation
-    if not data or "title" not in data:
-        return jsonify({"error": "Missing required fields"}), HTTPStatus.BAD_REQUEST
+    new_note = _new_note(body, user)
+    db.session.add(new_note)
+    db.session.commit()
 
-    # Generate a unique share ID
-    share_id = secrets.token_urlsafe(8)
+    return jsonify(new_note.to_dict()), HTTPStatus.CREATED
 
-    # Create a new note with a unique ID
-    new_note = Note(
-        title=data.get("title", "Untitled Note"),
-        content=data.get("content", {}),
-        note_id=len(notes) + 1,
-        user_id=user.id,
-        is_public=data.get('is_public', False),
-        share_id=share_id,
-        is_favorite=data.get("is_favorite", False),
-        tags=data.get("tags", []),
-        description=data.get("description", ""),
-    )
 
-    notes.append(new_note)
-    return jsonify(new_note.to_dict()), HTTPStatus.CREATED
+@notes_bp.route("/bulk/", methods=["POST"])
+@requires_auth
+def create_notes():
+    """Create several notes from a JSON array in one request."""
+    user = get_auth0_user()
+
+    try:
+        bodies = decode_request(list[NoteCreate])
+    except msgspec.DecodeError as e:
+        return jsonify({"error": "Invalid request body", "message": str(e)}), HTTPStatus.BAD_REQUEST
+
+    if len(bodies) > MAX_BULK_NOTES:
+        return (
+            jsonify({"error": f"At most {MAX_BULK_NOTES} notes can be created at once"}),
+            HTTPStatus.BAD_REQUEST,
+        )
+
+    new_notes = [_new_note(body, user) for body in bodies]
+    db.session.add_all(new_notes)
+    # Serialize once the INSERTs have assigned IDs but before the commit expires every note
+    db.session.flush()
+    created = [note.to_dict() for note in new_notes]
+    db.session.commit()
+
+    return jsonify(created), HTTPStatus.CREATED
 
 
 @notes_bp.route("/<int:note_id>/", methods=["GET"])
@@ -62,7 +134,7 @@ def create_note():
 def get_note(note_id):
     """Get a specific note by ID."""
     user = get_auth0_user()
-    note = next((n for n in notes if n.id == note_id and n.user_id == user.id and not n.is_deleted), None)
+    note = _get_user_note(note_id, user)
 
     if not note:
         return jsonify({"error": "Note not found"}), HTTPStatus.NOT_FOUND
@@ -74,14 +146,21 @@ def get_note(note_id):
 def get_shared_note(share_id):
     """Get a shared note by share ID."""
     # This endpoint is public and doesn't require authentication
-    note = next(
-        (n for n in notes if n.share_id == share_id and n.is_public and not n.is_deleted), None
-    )
+    meta = db.session.execute(
+        select(Note.id, Note.updated_at).where(
+            Note.share_id == share_id, Note.is_public.is_(True), Note.is_deleted.is_(False)
+        )
+    ).first()
 
-    if not note:
+    if not meta:
         return jsonify({"error": "Shared note not found or not public"}), HTTPStatus.NOT_FOUND
 
-    return jsonify(note.to_dict()), HTTPStatus.OK
+    etag = f"note-{meta.id}-{etag_version(meta.updated_at)}"
+    not_modified = not_modified_response(etag, "public, no-cache")
+    if not_modified:
+        return not_modified
+
+    return shared_json_response(etag, lambda: db.session.get(Note, meta.id).to_dict()), HTTPStatus.OK
 
 
 @notes_bp.route("/<int:note_id>/", methods=["PUT"])
@@ -89,29 +168,26 @@ def get_shared_note(share_id):
 def update_note(note_id):
     """Update a specific note."""
     user = get_auth0_user()
-    data = request.json
 
-    note = next((n for n in notes if n.id == note_id and n.user_id == user.id and not n.is_deleted), None)
+    try:
+        body = decode_request(NoteUpdate)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": "Invalid request body", "message": str(e)}), HTTPStatus.BAD_REQUEST
+
+    note = _get_user_note(note_id, user)
 
     if not note:
         return jsonify({"error": "Note not found"}), HTTPStatus.NOT_FOUND
 
-    # Update the note fields
-    if "title" in data:
-        note.title = data["title"]
-    if "content" in data:
-        note.content = data["content"]
-    if "is_public" in data:
-        note.is_public = data["is_public"]
-    if "is_favorite" in data:
-        note.is_favorite = data["is_favorite"]
-    if "tags" in data:
-        note.tags = data["tags"]
-    if "description" in data:
-        note.description = data["description"]
+    # Update the note fields that were sent
+    for field in body.__struct_fields__:
+        value = getattr(body, field)
+        if value is not msgspec.UNSET:
+            setattr(note, field, value)
 
     # Update the timestamp
-    note.updated_at = datetime.utcnow()
+    note.updated_at = g.request_time
+    db.session.commit()
 
     return jsonify(note.to_dict()), HTTPStatus.OK
 
@@ -122,16 +198,18 @@ def delete_note(note_id):
     """Delete a specific note (soft delete)."""
     user = get_auth0_user()
 
-    note = next((n for n in notes if n.id == note_id and n.user_id == user.id and not n.is_deleted), None)
+    note = _get_user_note(note_id, user)
 
     if not note:
         return jsonify({"error": "Note not found"}), HTTPStatus.NOT_FOUND
 
     # Mark the note as deleted (soft delete)
+    title = note.title
     note.is_deleted = True
-    note.updated_at = datetime.utcnow()
+    note.updated_at = g.request_time
+    db.session.commit()
 
-    return jsonify({"message": f"Note '{note.title}' deleted successfully"}), HTTPStatus.OK
+    return jsonify({"message": f"Note '{title}' deleted successfully"}), HTTPStatus.OK
 
 
 @notes_bp.route("/<int:note_id>/share/", methods=["POST"])
@@ -140,7 +218,7 @@ def share_note(note_id):
     """Generate or update a sharing link for a note."""
     user = get_auth0_user()
 
-    note = next((n for n in notes if n.id == note_id and n.user_id == user.id and not n.is_deleted), None)
+    note = _get_user_note(note_id, user)
 
     if not note:
         return jsonify({"error": "Note not found"}), HTTPStatus.NOT_FOUND
@@ -152,15 +230,17 @@ def share_note(note_id):
 
     # Generate a new share ID if requested or if one doesn't exist
     if data.get("regenerate", False) or not note.share_id:
-        note.share_id = secrets.token_urlsafe(8)
+        note.share_id = generate_share_id()
+    note.updated_at = g.request_time
+
+    share_id, is_public = note.share_id, note.is_public
+    db.session.commit()
 
     # Create the sharing URL
-    share_url = (
-        f"{os.environ.get('FRONTEND_URL', 'http://localhost:5173')}/shared/notes/{note.share_id}"
-    )
+    share_url = SHARE_URL_PREFIX + share_id
 
     return (
-        jsonify({"share_id": note.share_id, "share_url": share_url, "is_public": note.is_public}),
+        jsonify({"share_id": share_id, "share_url": share_url, "is_public": is_public}),
         HTTPStatus.OK,
     )
 
@@ -171,99 +251,92 @@ def convert_note_to_concept_map(note_id):
     """Convert a note to a concept map."""
     user = get_auth0_user()
 
-    note = next((n for n in notes if n.id == note_id and n.user_id == user.id and not n.is_deleted), None)
+    note = _get_user_note(note_id, user)
 
     if not note:
         return jsonify({"error": "Note not found"}),  HTTPStatus.NOT_FOUND
 
     try:
-        # Extract text content from the BlockNote format
-        # This is a simplified approach - in a real implementation, you'd need
-        # to parse the BlockNote JSON structure and extract meaningful text
-        content_text = ""
-        if isinstance(note.content, dict) and "content" in note.content:
-            for block in note.content["content"]:
-                if "content" in block and block["content"]:
-                    for item in block["content"]:
-                        if "text" in item:
-                            content_text += item["text"] + " "
-
-        # Fall back to title if content extraction fails
-        if not content_text.strip():
-            content_text = note.title
-
-        # Import the text extraction function
-        from concept_map_generation.mind_map import extract_concept_map_from_text
-
-        # Process the note content to generate concepts and relationships
-        concept_data = extract_concept_map_from_text(content_text)
-
-        # Prepare nodes and edges
-        nodes = []
-        edges = []
-
-        # Convert the concepts and relationships to nodes and edges
-        for concept in concept_data.get("concepts", []):
-            node = {
-                "id": concept.get("id", f"c{len(nodes) + 1}"),
-                "label": concept.get("name", "Unnamed Concept"),
-                "description": concept.get("description", ""),
-            }
-            nodes.append(node)
-
-        for relationship in concept_data.get("relationships", []):
-            edge = {
-                "source": relationship.get("source", ""),
-                "target": relationship.get("target", ""),
-                "label": relationship.get("label", "relates to"),
-            }
-            edges.append(edge)
-
-        # Create a new concept map
-        share_id = secrets.token_urlsafe(8)
-
-        # Generate SVG representation if possible
-        image = None
-        format_type = None
-
-        if nodes and edges:
-            try:
-                from concept_map_generation.mind_map import generate_concept_map_svg
-
-                # Create a concept map structure
-                concept_map_json = {"nodes": nodes, "edges": edges}
-
-                # Generate the SVG
-                image = generate_concept_map_svg(concept_map_json, "hierarchical")
-                format_type = "svg"
-            except Exception as img_error:
-                print(f"Error generating SVG for concept map: {str(img_error)}")
-
-        # Create the new concept map
-        new_map = ConceptMap(
-            name=f"From note: {note.title}",
-            nodes=nodes,
-            edges=edges,
-            map_id=len(concept_maps) + 1,
-            user_id=user.id,
-            is_public=False,
-            share_id=share_id,
-            image=image,
-            format=format_type,
-        )
+        if queue_requested():
+            task = submit_task("convert_note", _convert_note_task, note.title, note.content, user.id)
+            return queued_response(task)
 
-        concept_maps.append(new_map)
+        new_map = _note_to_concept_map(note.title, note.content, user.id)
+
+        # The generated SVG can dwarf the rest of the map, so leave it to be fetched from image_url
+        concept_map = new_map.to_dict()
+        del concept_map["image"]
 
         return (
             jsonify(
                 {
                     "message": "Note converted to concept map successfully",
-                    "concept_map": new_map.to_dict(),
+                    "concept_map": concept_map,
                 }
             ),
             HTTPStatus.CREATED,
         )
 
     except Exception as e:
-        print(f"Error converting note to concept map: {str(e)}")
+        logger.exception("Error converting note to concept map: %s", e)
         return jsonify({"error": f"Failed to convert note to concept map: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def _convert_note_task(title, content, user_id):
+    """Background variant of the conversion, the task result points at the new map."""
+    return {"concept_map_id": _note_to_concept_map(title, content, user_id).id}
+
+
+def _note_to_concept_map(title, content, user_id):
+    """Generate a concept map from a note's title and BlockNote content and store it."""
+    # Extract text content from the BlockNote format
+    # This is a simplified approach - in a real implementation, you'd need
+    # to parse the BlockNote JSON structure and extract meaningful text
+    blocks = (content.get("content") or []) if isinstance(content, dict) else []
+    content_text = " ".join(
+        item["text"] for block in blocks if block.get("content") for item in block["content"] if "text" in item
+    )
+
+    # Fall back to title if content extraction fails
+    if not content_text.strip():
+        content_text = title
+
+    # Extract (subject, relation, object) triples and turn every distinct concept into a node
+    model = get_gemini_model()
+    triples = extract_triples_from_text(content_text, model)
+
+    node_ids = {}
+    for subject, _, obj in triples:
+        for concept in (subject, obj):
+            node_ids.setdefault(concept, f"c{len(node_ids) + 1}")
+
+    nodes = [NodeIn(id=node_id, label=concept) for concept, node_id in node_ids.items()]
+    edges = [
+        EdgeIn(source=node_ids[subject], target=node_ids[obj], label=relation)
+        for subject, relation, obj in triples
+    ]
+
+    # Generate SVG representation if possible
+    image = None
+    format_type = None
+
+    if triples:
+        try:
+            image = generate_concept_map_svg(generate_concept_map_json(triples, model), "hierarchical")
+            format_type = "svg"
+        except Exception as img_error:
+            logger.exception("Error generating SVG for concept map: %s", img_error)
+
+    # Create the new concept map
+    new_map = ConceptMap(
+        name=f"From note: {title}",
+        user_id=user_id,
+        is_public=False,
+        image=image,
+        format=format_type,
+    )
+    db.session.add(new_map)
+    db.session.flush()
+    add_map_graph(new_map.id, nodes, edges)
+    db.session.commit()
+    return new_map
@@ -1,25 +1,112 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
 from http import HTTPStatus
 
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 
 from concept_map_generation.document_processor import DocumentProcessor
+from tasks.runner import queue_requested, queued_response, requires_auth_to_queue, submit_task
 
 process_bp = Blueprint("process", __name__)
-# Initialize document processor
+
+logger = logging.getLogger(__name__)
+
+# Shared document processor, built once per process
 document_processor = None
+_document_processor_lock = threading.Lock()
+
+# Content types accepted by the streaming upload endpoint, mapped to the file type the processor expects
+STREAM_CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "image/png": "png",
+    "image/jpeg": "jpg",
+}
+STREAM_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+DOCUMENT_EXTENSIONS = frozenset({"pdf", "jpg", "jpeg", "png"})
+
+
+def file_extension(filename):
+    """Lower-cased extension of a filename, or an empty string if it has none."""
+    _, dot, ext = filename.rpartition(".")
+    return ext.lower() if dot else ""
+
+
+def get_document_processor():
+    """Return the shared DocumentProcessor, creating it on first use."""
+    global document_processor
+
+    if document_processor is None:
+        with _document_processor_lock:
+            if document_processor is None:
+                document_processor = DocumentProcessor()
+    return document_processor
+
+
+def _extract_text(process, file_content, file_ext):
+    return {"success": True, "text": process(file_content, file_ext)}
+
+
+def _save_upload(stream, file_ext):
+    """
+    Copy an upload to a temporary path a chunk at a time and return the path, the caller
+    removes it. A copy that fails partway, e.g. on a full disk, removes it here instead.
+    """
+    with tempfile.NamedTemporaryFile(suffix=f".{file_ext}", delete=False) as upload:
+        try:
+            shutil.copyfileobj(stream, upload, STREAM_CHUNK_SIZE)
+        except BaseException:
+            upload.close()
+            os.remove(upload.name)
+            raise
+    return upload.name
+
+
+def _extract_text_from_file(process, path, file_ext):
+    try:
+        return _extract_text(process, path, file_ext)
+    finally:
+        os.remove(path)
+
+
+def _process_saved_upload(kind, process, path, file_ext):
+    """
+    Extract the text of a saved upload now, or queue it with ?async=1. Either way the
+    upload is removed once processed, or straight away if it can't be queued.
+    """
+    if not queue_requested():
+        return jsonify(_extract_text_from_file(process, path, file_ext))
+
+    try:
+        task = submit_task(kind, _extract_text_from_file, process, path, file_ext)
+    except BaseException:
+        os.remove(path)
+        raise
+    # From here on the task owns the file
+    return queued_response(task)
+
+
+@process_bp.record_once
+def warm_document_processor(state):
+    """Build the document processor at startup so the first upload doesn't pay for it."""
+    try:
+        get_document_processor()
+    except ValueError as e:
+        # Missing configuration, fall back to creating it on the first request
+        logger.warning("Document processor not initialized at startup: %s", e)
 
 
 @process_bp.route("/api/process-document/", methods=["POST"])
+@requires_auth_to_queue
 def process_document():
     """
     Process uploaded document and extract text content
     """
-    global document_processor
-
-    # Initialize document processor on first request
-    if document_processor is None:
-        document_processor = DocumentProcessor()
+    document_processor = get_document_processor()
 
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), HTTPStatus.BAD_REQUEST
@@ -29,11 +116,10 @@ def process_document():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), HTTPStatus.BAD_REQUEST
 
-    filename = secure_filename(file.filename)
-    file_ext = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    file_ext = file_extension(secure_filename(file.filename))
 
     # Check if file type is supported
-    if file_ext not in ["pdf", "jpg", "jpeg", "png"]:
+    if file_ext not in DOCUMENT_EXTENSIONS:
         return (
             jsonify(
                 {"error": "Unsupported file type. Please upload a PDF or image file."}
@@ -42,37 +128,32 @@ def process_document():
         )
 
     try:
-        # Read file content
-        file_content = file.read()
-
         # Check if financial document processing is requested
         doc_type = request.form.get("doc_type", "standard")
 
         # Process document based on document type
         if doc_type == "financial":
-            extracted_text = document_processor.process_financial_document(
-                file_content, file_ext
-            )
+            process = document_processor.process_financial_document
         else:
-            extracted_text = document_processor.process_document(file_content, file_ext)
+            process = document_processor.process_document
 
-        return jsonify({"success": True, "text": extracted_text})
+        # Process the upload from disk rather than reading all of it into memory,
+        # _process_saved_upload sees to it that it is removed again
+        path = _save_upload(file.stream, file_ext)
+        return _process_saved_upload("process_document", process, path, file_ext)
 
     except Exception as e:
-        print(f"Error processing document: {str(e)}")
+        logger.exception("Error processing document: %s", e)
         return jsonify({"error": f"Failed to process document: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 
 @process_bp.route("/api/process-financial-document/", methods=["POST"])
+@requires_auth_to_queue
 def process_financial_document():
     """
     Process uploaded financial document with specialized OCR
     """
-    global document_processor
-
-    # Initialize document processor on first request
-    if document_processor is None:
-        document_processor = DocumentProcessor()
+    document_processor = get_document_processor()
 
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), HTTPStatus.BAD_REQUEST
@@ -82,11 +163,10 @@ def process_financial_document():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), HTTPStatus.BAD_REQUEST
 
-    filename = secure_filename(file.filename)
-    file_ext = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    file_ext = file_extension(secure_filename(file.filename))
 
     # Check if file type is supported
-    if file_ext not in ["pdf", "jpg", "jpeg", "png"]:
+    if file_ext not in DOCUMENT_EXTENSIONS:
         return (
             jsonify(
                 {"error": "Unsupported file type. Please upload a PDF or image file."}
@@ -95,19 +175,55 @@ def process_financial_document():
         )
 
     try:
-        # Read file content
-        file_content = file.read()
-
         # Process document with financial document specific processing
-        extracted_text = document_processor.process_financial_document(
-            file_content, file_ext
-        )
+        process = document_processor.process_financial_document
 
-        return jsonify({"success": True, "text": extracted_text})
+        # Process the upload from disk rather than reading all of it into memory
+        path = _save_upload(file.stream, file_ext)
+        return _process_saved_upload("process_financial_document", process, path, file_ext)
 
     except Exception as e:
-        print(f"Error processing financial document: {str(e)}")
+        logger.exception("Error processing financial document: %s", e)
         return (
             jsonify({"error": f"Failed to process financial document: {str(e)}"}),
             HTTPStatus.INTERNAL_SERVER_ERROR,
         )
+
+
+@process_bp.route("/api/process-document/stream/", methods=["PUT"])
+@requires_auth_to_queue
+def process_document_stream():
+    """
+    Process a document sent as the raw request body instead of a multipart form.
+    The file type comes from the Content-Type header, pass ?doc_type=financial for financial documents.
+    """
+    file_ext = STREAM_CONTENT_TYPES.get(request.mimetype)
+    if file_ext is None:
+        return (
+            jsonify(
+                {"error": "Unsupported file type. Please upload a PDF or image file."}
+            ),
+            HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    document_processor = get_document_processor()
+
+    if request.args.get("doc_type", "standard") == "financial":
+        process = document_processor.process_financial_document
+    else:
+        process = document_processor.process_document
+
+    try:
+        # Copy the body to disk a chunk at a time so the upload is never held in memory,
+        # _process_saved_upload sees to it that it is removed again
+        path = _save_upload(request.stream, file_ext)
+
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+            return jsonify({"error": "No file uploaded"}), HTTPStatus.BAD_REQUEST
+
+        return _process_saved_upload("process_document", process, path, file_ext)
+
+    except Exception as e:
+        logger.exception("Error processing document: %s", e)
+        return jsonify({"error": f"Failed to process document: {str(e)}"}), HTTPStatus.INTERNAL_SERVER_ERROR
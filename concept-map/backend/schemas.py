@@ -0,0 +1,105 @@
+"""
+Request body schemas.
+Bodies are decoded and validated in a single pass with msgspec instead of
+parsing them with request.json and checking the keys by hand.
+"""
+
+from typing import Any, Optional, Union
+
+import msgspec
+from flask import request
+
+
+class Position(msgspec.Struct):
+    """Where a node is drawn on the canvas."""
+
+    x: Optional[float] = None
+    y: Optional[float] = None
+
+
+class NodeIn(msgspec.Struct):
+    """A node of a concept map, as sent by clients."""
+
+    id: Union[str, int, None] = None
+    label: str = ""
+    position: Optional[Position] = None
+    properties: Optional[dict] = {}
+
+
+class EdgeIn(msgspec.Struct):
+    """An edge of a concept map, as sent by clients."""
+
+    id: Union[str, int, None] = None
+    source: Union[str, int] = ""
+    target: Union[str, int] = ""
+    label: Optional[str] = ""
+    properties: Optional[dict] = {}
+
+
+class ConceptMapCreate(msgspec.Struct):
+    """Body of a request to create a concept map."""
+
+    name: str
+    nodes: list[NodeIn] = []
+    edges: list[EdgeIn] = []
+    image: Optional[str] = None
+    format: Optional[str] = "mindmap"
+    is_public: bool = False
+    is_favorite: bool = False
+    input_text: Optional[str] = ""
+    description: Optional[str] = ""
+    learning_objective: Optional[str] = ""
+    whiteboard_content: Any = None
+
+
+class ConceptMapUpdate(msgspec.Struct):
+    """
+    Body of a request to update a concept map.
+    Fields left out of the body stay UNSET and leave the map's value alone.
+    """
+
+    name: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    description: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+    is_public: Union[bool, msgspec.UnsetType] = msgspec.UNSET
+    is_favorite: Union[bool, msgspec.UnsetType] = msgspec.UNSET
+    image: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+    format: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+    input_text: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+    learning_objective: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+    whiteboard_content: Any = msgspec.UNSET
+    nodes: Union[list[NodeIn], msgspec.UnsetType] = msgspec.UNSET
+    edges: Union[list[EdgeIn], msgspec.UnsetType] = msgspec.UNSET
+
+
+class NoteCreate(msgspec.Struct):
+    """Body of a request to create a note."""
+
+    title: str
+    content: Any = {}
+    is_public: bool = False
+    is_favorite: bool = False
+    tags: list = []
+    description: Optional[str] = ""
+
+
+class NoteUpdate(msgspec.Struct):
+    """
+    Body of a request to update a note.
+    Fields left out of the body stay UNSET and leave the note's value alone.
+    """
+
+    title: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    content: Any = msgspec.UNSET
+    is_public: Union[bool, msgspec.UnsetType] = msgspec.UNSET
+    is_favorite: Union[bool, msgspec.UnsetType] = msgspec.UNSET
+    tags: Union[list, msgspec.UnsetType] = msgspec.UNSET
+    description: Union[Optional[str], msgspec.UnsetType] = msgspec.UNSET
+
+
+def decode_request(schema):
+    """
+    Decode the JSON request body into an instance of the given schema.
+    Raises msgspec.DecodeError (or its subclass msgspec.ValidationError)
+    when the body is not valid JSON or doesn't match the schema.
+    """
+    return msgspec.json.decode(request.get_data(cache=False), type=schema)
@@ -0,0 +1,21 @@
+from http import HTTPStatus
+
+from flask import Blueprint, jsonify
+
+from auth_utils import get_auth0_user_id, requires_auth
+from models import Task, db
+
+tasks_bp = Blueprint("tasks", __name__, url_prefix="/api/tasks")
+
+
+@tasks_bp.route("/<string:task_id>/", methods=["GET"])
+@requires_auth
+def get_task(task_id):
+    """Get the status of a background task, and its result once it has finished."""
+    task = db.session.get(Task, task_id)
+
+    # Results can hold extracted document text, so only the user who queued the task may see them
+    if not task or task.user_id != get_auth0_user_id():
+        return jsonify({"error": "Task not found"}), HTTPStatus.NOT_FOUND
+
+    return jsonify(task.to_dict()), HTTPStatus.OK
@@ -0,0 +1,117 @@
+"""
+Runs slow work (document OCR, concept map generation) on a background thread pool.
+Progress and results are stored in the tasks table so any worker process can report them.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import wraps
+from http import HTTPStatus
+
+from flask import current_app, jsonify, request
+
+from auth_utils import authenticate_request, get_auth0_user
+from models import Task, db, utc_now
+
+logger = logging.getLogger(__name__)
+
+task_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TASK_WORKERS", 4)), thread_name_prefix="tasks"
+)
+
+# Tasks still pending or running after TASK_TIMEOUT seconds were orphaned by a worker restart,
+# and every task is deleted TASK_RETENTION seconds after it was created
+TASK_TIMEOUT = int(os.environ.get("TASK_TIMEOUT", 3600))
+TASK_RETENTION = int(os.environ.get("TASK_RETENTION", 86400))
+REAP_INTERVAL = 300
+_last_reap = 0.0
+_reap_lock = threading.Lock()
+
+
+def submit_task(kind, fn, *args):
+    """Record a pending task for the current user and schedule ``fn(*args)`` to run in the background.
+
+    Whatever ``fn`` returns must be JSON serializable, it is stored as the task's result.
+    """
+    reap_tasks()
+
+    task = Task(kind=kind, user_id=get_auth0_user().id)
+    db.session.add(task)
+    db.session.commit()
+
+    task_pool.submit(_run_task, current_app._get_current_object(), task.id, kind, fn, args)
+    return task
+
+
+def queue_requested():
+    """Clients opt into background processing with ?async=1 and then poll /api/tasks/<id>/."""
+    return request.args.get("async") == "1"
+
+
+def requires_auth_to_queue(f):
+    """Let anyone call the endpoint, but require a valid token when ?async=1 queues a task for the caller."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if queue_requested():
+            denied = authenticate_request()
+            if denied:
+                return denied
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def queued_response(task):
+    return (
+        jsonify({"task_id": task.id, "status": task.status, "status_url": f"/api/tasks/{task.id}/"}),
+        HTTPStatus.ACCEPTED,
+    )
+
+
+def reap_tasks():
+    """Fail tasks orphaned by a restart and delete expired ones, at most once every REAP_INTERVAL seconds."""
+    global _last_reap
+
+    with _reap_lock:
+        now = time.monotonic()
+        if now - _last_reap < REAP_INTERVAL:
+            return
+        _last_reap = now
+
+    cutoff = utc_now()
+    Task.query.filter(
+        Task.status.in_(("pending", "running")),
+        Task.updated_at < cutoff - timedelta(seconds=TASK_TIMEOUT),
+    ).update(
+        {Task.status: "failed", Task.error: "Task was interrupted before it finished"},
+        synchronize_session=False,
+    )
+    Task.query.filter(Task.created_at < cutoff - timedelta(seconds=TASK_RETENTION)).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+
+
+def _run_task(app, task_id, kind, fn, args):
+    with app.app_context():
+        task = db.session.get(Task, task_id)
+        task.status = "running"
+        db.session.commit()
+
+        try:
+            result = fn(*args)
+            task.status = "succeeded"
+            task.result = result
+            db.session.commit()
+        except Exception as e:
+            logger.exception("Task %s (%s) failed", task_id, kind)
+            # fn may have left the session unusable, start over before recording the failure
+            db.session.rollback()
+            task = db.session.get(Task, task_id)
+            task.status = "failed"
+            task.error = str(e)
+            db.session.commit()
@@ -1,24 +1,35 @@
+import logging
 from http import HTTPStatus
 
-from flask import jsonify, Blueprint
+import orjson
+from flask import Response, jsonify, Blueprint
 
+from json_provider import OrjsonProvider
 from templates.templates_utils import mock_template_structures
 
 templates_bp = Blueprint("templates", __name__, url_prefix='/api/templates')
 
+logger = logging.getLogger(__name__)
+
+# The templates never change, so encode each one once instead of on every request
+template_responses = {
+    template_id: orjson.dumps(template_data, option=OrjsonProvider.option)
+    for template_id, template_data in mock_template_structures.items()
+}
+
 
 @templates_bp.route("/<string:template_id>/", methods=["GET"])
 def get_template_data(template_id):
     """Get the structure (nodes/edges/info) of a specific template."""
-    print(f"Received request for template ID: {template_id}")  # For debugging
+    logger.debug("Received request for template ID: %s", template_id)
 
-    # Find the template data in our mock dictionary
-    template_data = mock_template_structures.get(template_id)
+    # Find the pre-encoded template data
+    body = template_responses.get(template_id)
 
-    if not template_data:
-        print(f"Template not found: {template_id}")
+    if not body:
+        logger.debug("Template not found: %s", template_id)
         return jsonify({"error": "Template not found"}), HTTPStatus.NOT_FOUND
 
     # Return the found template data as JSON
-    print(f"Returning data for template: {template_id}")
-    return jsonify(template_data), HTTPStatus.OK
+    logger.debug("Returning data for template: %s", template_id)
+    return Response(body, mimetype="application/json"), HTTPStatus.OK
@@ -1,7 +1,52 @@
+import base64
+import gzip
+import io
 import json
+import os
+import tempfile
+import time
 import unittest
-from app import app
-from concept_map_generation.crud_routes import concept_maps
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from sqlalchemy import event
+
+import auth_utils
+from app import create_app
+from auth import routes as auth_routes
+from concept_map_generation import generation_routes
+from init_db import init_database
+from models import db, Task, User, utc_now
+from process import routes as process_routes
+from tasks import runner
+
+TEST_AUTH0_ID = "auth0|test-user"
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(32)
+
+
+class FakeDocumentProcessor:
+    """Stands in for the Gemini backed DocumentProcessor, recording the files it was given."""
+
+    def __init__(self):
+        self.calls = []
+
+    def process_document(self, path, file_ext):
+        with open(path, 'rb') as f:
+            self.calls.append(('standard', f.read(), file_ext, path))
+        return 'Extracted text'
+
+    def process_financial_document(self, path, file_ext):
+        with open(path, 'rb') as f:
+            self.calls.append(('financial', f.read(), file_ext, path))
+        return 'Extracted figures'
+
+
+class FakeClaims(dict):
+    """Stands in for the decoded Auth0 token claims."""
+
+    def validate(self):
+        pass
 
 
 class ConceptMapAPITestCase(unittest.TestCase):
@@ -9,10 +54,71 @@ class ConceptMapAPITestCase(unittest.TestCase):
 
     def setUp(self):
         """Set up test client and other test variables."""
-        app.testing = True
-        self.client = app.test_client()
-        # Reset in-memory storage for each test
-        concept_maps.clear()
+        # Fresh in-memory database per test, with lazy loads raising to catch N+1 queries
+        self.app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "RAISE_ON_LAZY": True,
+        })
+        # Accept any bearer token as the test user instead of verifying it against Auth0
+        decode = mock.patch.object(auth_utils.jwt, "decode", return_value=FakeClaims(sub=TEST_AUTH0_ID))
+        decode.start()
+        self.addCleanup(decode.stop)
+
+        auth_utils._user_ids.clear()
+
+        self.client = self.app.test_client()
+        self.client.environ_base["HTTP_AUTHORIZATION"] = "Bearer test-token"
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(email="test@example.com", auth0_id=TEST_AUTH0_ID))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count_queries(self, method, url, **kwargs):
+        """Make a request and return the response along with the number of SQL statements it ran."""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            res = self.client.open(url, method=method, **kwargs)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        return res, len(statements)
+
+    def use_upload_folder(self):
+        """Point avatar uploads at a temporary folder and return it."""
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        trash = os.path.join(folder.name, '.trash')
+        os.makedirs(trash)
+        for name, value in (('UPLOAD_FOLDER', folder.name), ('TRASH_FOLDER', trash), ('_reaper_started', True)):
+            patcher = mock.patch.object(auth_routes, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return folder.name
+
+    def create_map(self, name, node_count=0, edge_count=0):
+        res = self.client.post(
+            '/api/concept-maps/',
+            data=json.dumps({
+                'name': name,
+                'nodes': [{'id': f'n{i}', 'label': f'Concept {i}'} for i in range(node_count)],
+                'edges': [{'source': 'n0', 'target': f'n{i}'} for i in range(edge_count)],
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 201)
+        return json.loads(res.data)['id']
 
     def test_health_check(self):
         """Test API can return a health check response (GET request)."""
@@ -120,5 +226,553 @@ class ConceptMapAPITestCase(unittest.TestCase):
         res = self.client.get(f'/api/concept-maps/{map_id}/')
         self.assertEqual(res.status_code, 404)
 
+    def test_list_query_count_does_not_grow_with_maps(self):
+        """Test listing maps loads nodes and edges with a fixed number of queries."""
+        self.create_map('First', node_count=3, edge_count=2)
+        _, single_map_queries = self.count_queries('GET', '/api/concept-maps/')
+
+        for i in range(4):
+            self.create_map(f'Map {i}', node_count=3, edge_count=2)
+        res, many_map_queries = self.count_queries('GET', '/api/concept-maps/')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data)), 5)
+        self.assertEqual(many_map_queries, single_map_queries)
+        # User, ETag check, maps, nodes, edges
+        self.assertLessEqual(many_map_queries, 5)
+
+    def test_saved_maps_query_count_does_not_grow_with_maps(self):
+        """Test the saved maps listing doesn't lazy load nodes and edges per map."""
+        for i in range(3):
+            self.create_map(f'Map {i}', node_count=2, edge_count=1)
+
+        res, queries = self.count_queries('GET', '/api/user/saved-maps/')
+
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(len(data), 3)
+        self.assertTrue(all(len(m['nodes']) == 2 and len(m['edges']) == 1 for m in data))
+        self.assertLessEqual(queries, 4)
+
+    def test_summary_view_lists_maps_without_their_content(self):
+        """Test ?view=summary lists maps without nodes, edges, image or input text."""
+        for i in range(3):
+            self.create_map(f'Map {i}', node_count=2, edge_count=1)
+
+        for url in ('/api/concept-maps/?view=summary', '/api/user/saved-maps/?view=summary'):
+            res, queries = self.count_queries('GET', url)
+
+            self.assertEqual(res.status_code, 200)
+            data = json.loads(res.data)
+            self.assertEqual(len(data), 3)
+            for m in data:
+                self.assertIn('name', m)
+                self.assertFalse({'nodes', 'edges', 'image', 'input_text'} & m.keys())
+            self.assertLessEqual(queries, 3)
+
+    def test_node_and_edge_writes_are_batched(self):
+        """Test creating and updating a map runs the same statements for 5 or 50 nodes and edges."""
+        def body(count):
+            return json.dumps({
+                'name': 'Batched',
+                'nodes': [{'label': f'Concept {i}'} for i in range(count)],
+                'edges': [{'source': 'a', 'target': 'b'} for _ in range(count)],
+            })
+
+        _, small_create = self.count_queries('POST', '/api/concept-maps/', data=body(5), content_type='application/json')
+        res, large_create = self.count_queries('POST', '/api/concept-maps/', data=body(50), content_type='application/json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(large_create, small_create)
+
+        map_id = json.loads(res.data)['id']
+        _, small_update = self.count_queries('PUT', f'/api/concept-maps/{map_id}/', data=body(5), content_type='application/json')
+        res, large_update = self.count_queries('PUT', f'/api/concept-maps/{map_id}/', data=body(50), content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data)['nodes']), 50)
+        self.assertEqual(large_update, small_update)
+
+    def test_malformed_nodes_are_rejected_before_any_write(self):
+        """Test nodes and edges that aren't objects get a 400 and leave the saved map untouched."""
+        map_id = self.create_map('Valid', node_count=2, edge_count=1)
+
+        for body in ({'nodes': ['n0', 'n1']}, {'edges': [42]}, {'nodes': [{'label': 'A', 'position': 'top'}]}):
+            res = self.client.put(
+                f'/api/concept-maps/{map_id}/', data=json.dumps(body), content_type='application/json'
+            )
+            self.assertEqual(res.status_code, 400)
+
+        res = self.client.post(
+            '/api/concept-maps/', data=json.dumps({'name': 'Bad', 'nodes': [None]}), content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 400)
+
+        data = json.loads(self.client.get(f'/api/concept-maps/{map_id}/').data)
+        self.assertEqual(len(data['nodes']), 2)
+        self.assertEqual(len(data['edges']), 1)
+
+    def test_map_image_is_served_as_raw_bytes(self):
+        """Test a map's image is decoded from storage, gzipped for clients that accept it and cached by ETag."""
+        svg = '<svg xmlns="http://www.w3.org/2000/svg">' + '<rect/>' * 200 + '</svg>'
+        res = self.client.post(
+            '/api/concept-maps/', data=json.dumps({'name': 'Drawn', 'image': svg, 'format': 'svg'}),
+            content_type='application/json'
+        )
+        map_id = json.loads(res.data)['id']
+
+        res = self.client.get(f'/api/concept-maps/{map_id}/image/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'image/svg+xml')
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.data).decode(), svg)
+
+        res = self.client.get(f'/api/concept-maps/{map_id}/image/', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+        png = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+        self.client.put(f'/api/concept-maps/{map_id}/', data=json.dumps({'image': png}), content_type='application/json')
+        res = self.client.get(f'/api/concept-maps/{map_id}/image/')
+        self.assertEqual((res.mimetype, res.data), ('image/png', PNG_BYTES))
+
+        map_without_image = self.create_map('Plain')
+        self.assertEqual(self.client.get(f'/api/concept-maps/{map_without_image}/image/').status_code, 404)
+
+    def test_unchanged_maps_return_not_modified(self):
+        """Test the map list and a single map answer a matching If-None-Match with 304."""
+        map_id = self.create_map('Cached', node_count=2)
+
+        for url in ('/api/concept-maps/', f'/api/concept-maps/{map_id}/'):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            etag = res.headers['ETag']
+
+            res = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+
+        # Saving the map gives both a new ETag
+        self.client.put(
+            f'/api/concept-maps/{map_id}/',
+            data=json.dumps({'name': 'Renamed'}),
+            content_type='application/json'
+        )
+        res = self.client.get(f'/api/concept-maps/{map_id}/', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['name'], 'Renamed')
+
+    def test_notes_are_stored_in_the_database(self):
+        """Test notes are persisted and looked up through the database rather than process memory."""
+        res = self.client.post(
+            '/api/notes/',
+            data=json.dumps({'title': 'Stored', 'content': {'type': 'doc'}}),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 201)
+        note = json.loads(res.data)
+
+        with self.app.app_context():
+            db.session.remove()
+
+        res = self.client.get(f'/api/notes/{note["id"]}/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['content'], {'type': 'doc'})
+
+        # Only public notes can be opened through their share ID
+        res = self.client.get(f'/api/notes/shared/{note["share_id"]}/')
+        self.assertEqual(res.status_code, 404)
+        self.client.post(f'/api/notes/{note["id"]}/share/', data=json.dumps({}), content_type='application/json')
+        res = self.client.get(f'/api/notes/shared/{note["share_id"]}/')
+        self.assertEqual(res.status_code, 200)
+
+        self.client.delete(f'/api/notes/{note["id"]}/')
+        res = self.client.get('/api/notes/')
+        self.assertEqual(json.loads(res.data), [])
+
+    def test_note_updates_are_validated(self):
+        """Test a note update only changes the fields sent, and rejects malformed bodies with 400."""
+        res = self.client.post(
+            '/api/notes/', data=json.dumps({'title': 'Draft', 'tags': ['a']}), content_type='application/json'
+        )
+        note_id = json.loads(res.data)['id']
+
+        res = self.client.put(
+            f'/api/notes/{note_id}/', data=json.dumps({'is_favorite': True}), content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual((data['title'], data['tags'], data['is_favorite']), ('Draft', ['a'], True))
+
+        for body in ('', 'not json', json.dumps({'title': None}), json.dumps({'tags': 'a'})):
+            res = self.client.put(f'/api/notes/{note_id}/', data=body, content_type='application/json')
+            self.assertEqual(res.status_code, 400)
+
+    def test_bulk_note_creation(self):
+        """Test several notes are created from one JSON array, and a bad item rejects the whole batch."""
+        body = [{'title': f'Note {i}', 'tags': [str(i)]} for i in range(3)]
+        res = self.client.post('/api/notes/bulk/', data=json.dumps(body), content_type='application/json')
+        self.assertEqual(res.status_code, 201)
+        created = json.loads(res.data)
+        self.assertEqual([note['title'] for note in created], ['Note 0', 'Note 1', 'Note 2'])
+        self.assertTrue(all(note['id'] and note['share_id'] for note in created))
+
+        res = self.client.post(
+            '/api/notes/bulk/', data=json.dumps([{'title': 'Fine'}, {'tags': []}]), content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(len(json.loads(self.client.get('/api/notes/').data)), 3)
+
+    def test_unchanged_notes_return_not_modified(self):
+        """Test the note list answers a matching If-None-Match with 304 until a note changes."""
+        res = self.client.post('/api/notes/', data=json.dumps({'title': 'Cached'}), content_type='application/json')
+        note_id = json.loads(res.data)['id']
+
+        etag = self.client.get('/api/notes/').headers['ETag']
+        res = self.client.get('/api/notes/', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+        # Sharing changes what the list returns, so it needs a new ETag too
+        self.client.post(f'/api/notes/{note_id}/share/', data=json.dumps({}), content_type='application/json')
+        res = self.client.get('/api/notes/', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(json.loads(res.data)[0]['is_public'])
+    def run_queued(self, url, **kwargs):
+        """POST with ?async=1, wait for the background task to finish and return its status."""
+        pool = ThreadPoolExecutor(max_workers=1)
+        with mock.patch.object(runner, 'task_pool', pool):
+            res = self.client.post(url + '?async=1', **kwargs)
+        pool.shutdown(wait=True)
+        self.assertEqual(res.status_code, 202)
+
+        res = self.client.get(json.loads(res.data)['status_url'])
+        self.assertEqual(res.status_code, 200)
+        return json.loads(res.data)
+
+    def test_queued_generation_reports_its_result(self):
+        """Test ?async=1 queues generation as a task the caller can poll for the result."""
+        body = json.dumps({'text': 'Cells contain DNA', 'mapType': 'mindmap'})
+        result = {'image': '<svg/>', 'format': 'svg'}
+        with mock.patch.object(generation_routes, '_generate_visualization', return_value=result):
+            task = self.run_queued('/api/concept-maps/generate/', data=body, content_type='application/json')
+
+        self.assertEqual(task['kind'], 'generate_map')
+        self.assertEqual(task['status'], 'succeeded')
+        self.assertEqual(task['result'], result)
+
+        # Queueing needs a token, even though the endpoint itself is public
+        res = self.client.post(
+            '/api/concept-maps/generate/?async=1',
+            data=body,
+            content_type='application/json',
+            headers={'Authorization': ''},
+        )
+        self.assertEqual(res.status_code, 401)
+
+    def use_document_processor(self):
+        processor = FakeDocumentProcessor()
+        patcher = mock.patch.object(process_routes, 'get_document_processor', return_value=processor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return processor
+
+    def test_process_document_extracts_text_from_uploads(self):
+        """Test uploaded documents are processed from a temporary file that is removed afterwards."""
+        processor = self.use_document_processor()
+
+        res = self.client.post(
+            '/api/process-document/',
+            data={'file': (io.BytesIO(b'%PDF-1.4 report'), 'report.PDF'), 'doc_type': 'financial'},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data), {'success': True, 'text': 'Extracted figures'})
+        kind, content, file_ext, path = processor.calls[-1]
+        self.assertEqual((kind, content, file_ext), ('financial', b'%PDF-1.4 report', 'pdf'))
+        self.assertFalse(os.path.exists(path))
+
+        res = self.client.post(
+            '/api/process-financial-document/',
+            data={'file': (io.BytesIO(PNG_BYTES), 'scan.png')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(json.loads(res.data)['text'], 'Extracted figures')
+
+        res = self.client.post(
+            '/api/process-document/',
+            data={'file': (io.BytesIO(b'text'), 'notes.txt')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_process_document_stream_reads_the_raw_body(self):
+        """Test the streaming endpoint takes the file type from Content-Type and rejects empty bodies."""
+        processor = self.use_document_processor()
+
+        res = self.client.put('/api/process-document/stream/', data=b'%PDF-1.4 body', content_type='application/pdf')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['text'], 'Extracted text')
+        self.assertEqual(processor.calls[-1][:3], ('standard', b'%PDF-1.4 body', 'pdf'))
+
+        res = self.client.put('/api/process-document/stream/', data=b'', content_type='application/pdf')
+        self.assertEqual(res.status_code, 400)
+        res = self.client.put('/api/process-document/stream/', data=b'text', content_type='text/plain')
+        self.assertEqual(res.status_code, 415)
+
+    def test_uploads_are_removed_when_they_cannot_be_processed(self):
+        """Test temporary uploads don't leak when queueing fails or the copy breaks off partway."""
+        self.use_document_processor()
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        patcher = mock.patch.object(tempfile, 'tempdir', folder.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        with mock.patch.object(process_routes, 'submit_task', side_effect=RuntimeError('database is down')):
+            res = self.client.post(
+                '/api/process-document/?async=1',
+                data={'file': (io.BytesIO(b'%PDF-1.4 report'), 'report.pdf')},
+                content_type='multipart/form-data'
+            )
+            self.assertEqual(res.status_code, 500)
+            res = self.client.put(
+                '/api/process-document/stream/?async=1', data=b'%PDF-1.4 body', content_type='application/pdf'
+            )
+            self.assertEqual(res.status_code, 500)
+        self.assertEqual(os.listdir(folder.name), [])
+
+        class BrokenStream(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise OSError('No space left on device')
+                return super().read(4)
+
+        with self.assertRaises(OSError):
+            process_routes._save_upload(BrokenStream(b'%PDF-1.4 body'), 'pdf')
+        self.assertEqual(os.listdir(folder.name), [])
+
+    def test_queued_document_processing_reports_the_text(self):
+        """Test ?async=1 processes an upload as a background task."""
+        self.use_document_processor()
+
+        task = self.run_queued(
+            '/api/process-document/',
+            data={'file': (io.BytesIO(b'%PDF-1.4 report'), 'report.pdf')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(task['kind'], 'process_document')
+        self.assertEqual(task['status'], 'succeeded')
+        self.assertEqual(task['result'], {'success': True, 'text': 'Extracted text'})
+
+    def test_failed_task_is_recorded_after_a_database_error(self):
+        """Test a task whose work breaks the session is still marked as failed."""
+        def duplicate_user(*args):
+            db.session.add(User(email='test@example.com', auth0_id='auth0|duplicate'))
+            db.session.flush()
+
+        body = json.dumps({'text': 'Cells contain DNA', 'mapType': 'mindmap'})
+        with mock.patch.object(generation_routes, '_generate_visualization', side_effect=duplicate_user):
+            task = self.run_queued('/api/concept-maps/generate/', data=body, content_type='application/json')
+
+        self.assertEqual(task['status'], 'failed')
+        self.assertIn('UNIQUE', task['error'])
+
+    def test_tasks_are_only_visible_to_their_owner(self):
+        """Test polling requires a token and hides other users' tasks."""
+        with self.app.app_context():
+            other = User(email='other@example.com', auth0_id='auth0|other-user')
+            db.session.add(other)
+            db.session.flush()
+            task = Task(kind='process_document', user_id=other.id)
+            db.session.add(task)
+            db.session.commit()
+            task_id = task.id
+
+        res = self.client.get(f'/api/tasks/{task_id}/')
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(f'/api/tasks/{task_id}/', headers={'Authorization': ''})
+        self.assertEqual(res.status_code, 401)
+
+    def test_orphaned_tasks_are_failed_and_old_tasks_deleted(self):
+        """Test the reaper fails tasks left running by a restart and deletes expired ones."""
+        with self.app.app_context():
+            user = User.query.first()
+            now = utc_now()
+            db.session.add_all([
+                Task(id='orphaned', kind='generate_map', user_id=user.id, status='running',
+                     created_at=now, updated_at=now - timedelta(seconds=runner.TASK_TIMEOUT + 1)),
+                Task(id='expired', kind='generate_map', user_id=user.id, status='succeeded',
+                     created_at=now - timedelta(seconds=runner.TASK_RETENTION + 1), updated_at=now),
+                Task(id='recent', kind='generate_map', user_id=user.id, status='running',
+                     created_at=now, updated_at=now),
+            ])
+            db.session.commit()
+
+            with mock.patch.object(runner, '_last_reap', float('-inf')):
+                runner.reap_tasks()
+
+            statuses = {task.id: task.status for task in Task.query}
+        self.assertEqual(statuses, {'orphaned': 'failed', 'recent': 'running'})
+
+    def test_avatar_upload_is_stored_and_served(self):
+        """Test a multipart avatar upload is saved under uploads and served back from its URL."""
+        folder = self.use_upload_folder()
+
+        res = self.client.post(
+            '/api/auth/profile/avatar/',
+            data={'avatar': (io.BytesIO(PNG_BYTES), 'me.png')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(res.status_code, 200)
+        filename = json.loads(res.data)['avatarUrl'].rsplit('/', 1)[-1]
+        self.assertTrue(os.path.isfile(os.path.join(folder, filename)))
+
+        res = self.client.get(f'/uploads/{filename}/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, PNG_BYTES)
+
+        res = self.client.post(
+            '/api/auth/profile/avatar/',
+            data={'avatar': (io.BytesIO(b'not an image'), 'notes.txt')},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_raw_avatar_upload_replaces_the_previous_avatar(self):
+        """Test a raw avatar upload is sniffed, stored and sends the avatar it replaces to the trash."""
+        folder = self.use_upload_folder()
+
+        paths = []
+        for _ in range(2):
+            res = self.client.put('/api/auth/profile/avatar-raw/', data=PNG_BYTES, content_type='image/png')
+            self.assertEqual(res.status_code, 200)
+            paths.append(os.path.join(folder, json.loads(res.data)['avatarUrl'].rsplit('/', 1)[-1]))
+
+        self.assertTrue(paths[1].endswith('.png'))
+        self.assertTrue(os.path.isfile(paths[1]))
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertEqual(len(os.listdir(auth_routes.TRASH_FOLDER)), 1)
+
+        res = self.client.put('/api/auth/profile/avatar-raw/', data=b'GIF-ish', content_type='image/gif')
+        self.assertEqual(res.status_code, 400)
+
+    def test_failed_upload_write_leaves_no_file(self):
+        """Test an upload that fails partway through is removed instead of left in uploads."""
+        folder = self.use_upload_folder()
+
+        def write(f):
+            f.write(PNG_BYTES)
+            raise OSError('disk full')
+
+        with self.assertRaises(OSError):
+            auth_routes._store_upload('partial.png', write)
+        self.assertEqual(os.listdir(folder), ['.trash'])
+
+    def test_deleted_account_loses_its_data_and_access(self):
+        """Test deleting an account soft deletes its maps and notes, trashes its avatar and revokes access."""
+        folder = self.use_upload_folder()
+        self.client.put('/api/auth/profile/avatar-raw/', data=PNG_BYTES, content_type='image/png')
+        self.create_map('Mine', node_count=1)
+        self.client.post('/api/notes/', data=json.dumps({'title': 'Mine'}), content_type='application/json')
+
+        user_id = json.loads(self.client.get('/api/auth/profile/').data)['id']
+        recent_notes = f'/api/user/{user_id}/recent-notes/'
+        self.assertEqual(self.client.get(recent_notes).status_code, 200)
+
+        res = self.client.delete('/api/auth/account/')
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            self.assertFalse(db.session.get(User, user_id).is_active)
+        self.assertEqual(json.loads(self.client.get('/api/concept-maps/').data), [])
+        self.assertEqual(json.loads(self.client.get('/api/notes/').data), [])
+        self.assertEqual(os.listdir(folder), ['.trash'])
+        # The user ID cached by the earlier request is dropped with the account
+        self.assertEqual(self.client.get(recent_notes).status_code, 403)
+
+    def test_uploads_are_handed_to_nginx_when_configured(self):
+        """Test uploads are served with X-Accel-Redirect when X_ACCEL_UPLOADS_PREFIX is set."""
+        with mock.patch.object(auth_routes, 'X_ACCEL_UPLOADS_PREFIX', '/internal_uploads/'):
+            res = self.client.get('/uploads/avatar.png/')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['X-Accel-Redirect'], '/internal_uploads/avatar.png')
+        self.assertEqual(res.mimetype, 'image/png')
+        self.assertEqual(res.data, b'')
+
+    def test_removed_avatars_are_trashed_then_reaped(self):
+        """Test removing an avatar moves the file to the trash, which the reaper then empties."""
+        folder = self.use_upload_folder()
+        res = self.client.post(
+            '/api/auth/profile/avatar/',
+            data={'avatar': (io.BytesIO(PNG_BYTES), 'me.png')},
+            content_type='multipart/form-data'
+        )
+        filename = json.loads(res.data)['avatarUrl'].rsplit('/', 1)[-1]
+
+        res = self.client.delete('/api/auth/profile/avatar/')
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(os.path.exists(os.path.join(folder, filename)))
+        self.assertEqual(len(os.listdir(auth_routes.TRASH_FOLDER)), 1)
+
+        auth_routes._empty_trash()
+        self.assertEqual(os.listdir(auth_routes.TRASH_FOLDER), [])
+
+    def test_validated_token_claims_are_cached(self):
+        """Test a token is only decoded once while its cached claims are valid."""
+        auth_utils._token_cache.clear()
+        self.addCleanup(auth_utils._token_cache.clear)
+        claims = FakeClaims(sub=TEST_AUTH0_ID, exp=time.time() + 600)
+
+        with mock.patch.object(auth_utils.jwt, 'decode', return_value=claims) as decode:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/api/notes/').status_code, 200)
+            self.assertEqual(decode.call_count, 1)
+
+            # A token that has expired is validated again
+            claims['exp'] = time.time() - 1
+            auth_utils._token_cache.clear()
+            self.client.get('/api/notes/')
+            self.client.get('/api/notes/')
+            self.assertEqual(decode.call_count, 3)
+
+    def test_jwks_refetched_for_unknown_key_ids(self):
+        """Test signing keys are cached, refetched for a rotated key ID, and not refetched for bogus ones."""
+        for name in ('_jwks', '_jwks_kids', '_jwks_expires_at', '_jwks_fetched_at'):
+            patcher = mock.patch.object(auth_utils, name, getattr(auth_utils, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        auth_utils._jwks, auth_utils._jwks_kids = {'keys': []}, frozenset()
+        auth_utils._jwks_expires_at, auth_utils._jwks_fetched_at = 0.0, float('-inf')
+
+        key_sets = [{'keys': [{'kid': 'old'}]}, {'keys': [{'kid': 'old'}, {'kid': 'new'}]}]
+        with mock.patch.object(auth_utils, 'fetch_jwks', side_effect=key_sets) as fetch:
+            self.assertEqual(auth_utils.get_jwks('old'), key_sets[0])
+            self.assertEqual(auth_utils.get_jwks('old'), key_sets[0])
+            self.assertEqual(fetch.call_count, 1)
+
+            # Auth0 rotated its keys, so the first token signed with the new one triggers a refetch
+            auth_utils._jwks_fetched_at -= auth_utils.JWKS_RETRY_INTERVAL
+            self.assertEqual(auth_utils.get_jwks('new'), key_sets[1])
+            self.assertEqual(auth_utils.get_jwks('made-up'), key_sets[1])
+            self.assertEqual(fetch.call_count, 2)
+
+            # Once stale, requests holding keys don't wait for a refresh already in flight
+            auth_utils._jwks_expires_at = 0.0
+            with auth_utils._jwks_lock:
+                self.assertEqual(auth_utils.get_jwks('new'), key_sets[1])
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_init_database_leaves_no_pooled_connections(self):
+        """Test setting up a database closes its connections, so forked workers don't share them."""
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{folder.name}/fresh.db'})
+
+        self.assertTrue(init_database(app))
+        self.assertFalse(init_database(app))
+        with app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+            self.assertIn('alembic_version', db.inspect(db.engine).get_table_names())
+            db.engine.dispose()
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file